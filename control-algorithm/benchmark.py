@@ -0,0 +1,214 @@
+# Description: Desktop benchmarks for the Controller and Car programs. Times message encoding and decoding, gain lookups, the PID update and pin writes on synthetic radio messages, then runs both programs in the simulator to measure the time spent on each loop iteration and the loop jitter.
+# Version: 20261018-1230
+
+# ========== Library Imports
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import gains
+import protocol
+import telemetry
+from pid import PID, limit_func
+from plant import plant_step, steering_pins, steering_min, steering_max, steering_centre
+from simulator import Simulation, Pin, square_wave
+
+# ========== Benchmark Config
+message_count = 1000 # Number of synthetic radio messages decoded per timing run
+gain_keys = ['Gp', 'Gi', 'Gd']
+car_address = 1 # Address of the car the synthetic messages are sent to
+loop_budget = {'car': 10, 'controller': 20} # Time available for each loop iteration (ms), matches loop_period in car.py and the sleep in controller.py
+histogram_edges = [0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20]
+# Upper edges (ms) of the bins iteration times are counted in, anything longer goes in a final bin
+
+# ========== Lambda Declaration
+# Lambda declaration for converting a value from one range to another, matches the Car program
+mapping = lambda value, InitMin, InitMax, NewMin, NewMax : (((NewMax - NewMin)/(InitMax - InitMin)) * (value - InitMax)) + NewMax
+
+# ========== Class Declaration
+class StubDevice:
+    # Minimal device for the simulator pins so pin writes can be timed without running a simulation
+    def tick(self):
+        pass
+
+# ========== Function Declaration
+def synthetic_messages(count, seed, indexed=False, address=car_address):
+    # Function to build radio messages with random requests and gains, as the controller would send them to the car at address
+    generator = random.Random(seed)
+    messages = []
+    for seq in range(count):
+        forward = generator.random() < 0.5
+        steer = generator.randint(-1023, 1023)
+        readings = [generator.randint(0, 1023) for key in gain_keys]
+        if indexed:
+            indexes = [gains.gain_index(reading) for reading in readings]
+            messages.append(protocol.encode_indexed(address, seq, forward, not forward, steer, *indexes))
+        else:
+            values = [gains.tables[key][gains.gain_index(reading)] for key, reading in zip(gain_keys, readings)]
+            messages.append(protocol.encode(address, seq, forward, not forward, steer, *values))
+    return messages
+
+
+def car_step_func():
+    # Function returning one iteration of the Car program's message handling: decode, gain update, PID update and pin writes
+    # Follows the statements in car.py so the time per call approximates the work done each loop
+    device = StubDevice()
+    forw_p, back_p, left_p, right_p = Pin(device), Pin(device), Pin(device), Pin(device)
+    steering_pid = PID(0, 0, 0, output_min=-1023, output_max=1023, derivative_filter=0.5)
+    state = {'pos': steering_centre}
+
+    def car_step(packet):
+        if not protocol.accepts(packet, car_address):
+            return
+        seq, forw_value, back_value, requ_steer, Gp, Gi, Gd = protocol.decode(packet)
+        steering_pid.set_gains(Gp, Gi, Gd)
+        norm_requ_steer = limit_func(mapping(requ_steer, -1023, 1023, steering_min, steering_max), steering_min, steering_max)
+        adjustment = steering_pid.update(norm_requ_steer, state['pos'], 10)
+
+        left_value, right_value = steering_pins(adjustment, state['pos'])
+        forw_p.write_digital(forw_value)
+        back_p.write_digital(back_value)
+        left_p.write_analog(left_value)
+        right_p.write_analog(right_value)
+        state['pos'] = plant_step(state['pos'], left_value, right_value, 10)
+
+    return car_step
+
+
+def time_per_call(func, items, repeat):
+    # Function to get the best time (s) per item of calling func on every item, over repeat runs
+    run = lambda: [func(item) for item in items]
+    return min(timeit.repeat(run, number=1, repeat=repeat)) / len(items)
+
+
+def micro_benchmarks(repeat, seed):
+    # Function to time each part of the message handling on synthetic messages
+    # Returns a list of (name, seconds per call)
+    messages = synthetic_messages(message_count, seed)
+    indexed_messages = synthetic_messages(message_count, seed, indexed=True)
+    other_messages = synthetic_messages(message_count, seed, address=car_address + 1) # Traffic for another car sharing the group
+    generator = random.Random(seed)
+    readings = [generator.randint(0, 1023) for index in range(message_count)]
+    decoded = [protocol.decode(message) for message in messages]
+    steering_pid = PID(2, 0.001, 10, output_min=-1023, output_max=1023, derivative_filter=0.5)
+    pin = Pin(StubDevice())
+    lcl_telemetry = telemetry.Telemetry('benchmark', ['Req', 'Pos', 'Adj', 'P', 'I', 'D', 'Left', 'Right', 'Forward', 'Backward', 'Overruns'],
+                                        telemetry.level_info, output=lambda line: None)
+    telemetry_rows = []
+    for seq, forw_value, back_value, requ_steer, Gp, Gi, Gd in decoded:
+        # One value per field, in the order car.py records them: request, position, adjustment, P, I, D, pin values and overruns (none)
+        norm_requ_steer = limit_func(mapping(requ_steer, -1023, 1023, steering_min, steering_max), steering_min, steering_max)
+        error = norm_requ_steer - steering_centre
+        adjustment = limit_func(error * Gp, -1023, 1023)
+        left_value, right_value = steering_pins(adjustment, steering_centre)
+        telemetry_rows.append((norm_requ_steer, steering_centre, adjustment, error * Gp, error * Gi, error * Gd, left_value, right_value, forw_value, back_value, 0))
+
+    return [
+        ('protocol.encode', time_per_call(lambda message: protocol.encode(car_address, *message), decoded, repeat)),
+        ('protocol.decode', time_per_call(protocol.decode, messages, repeat)),
+        ('protocol.decode (indexed)', time_per_call(protocol.decode, indexed_messages, repeat)),
+        ('protocol.accepts (other car)', time_per_call(lambda message: protocol.accepts(message, car_address), other_messages, repeat)),
+        ('gains lookup', time_per_call(lambda reading: gains.tables['Gd'][gains.gain_index(reading)], readings, repeat)),
+        ('PID.update', time_per_call(lambda message: steering_pid.update(525 + message[3] / 4, 525, 10), decoded, repeat)),
+        ('pin write', time_per_call(pin.write_analog, readings, repeat)),
+        ('car step', time_per_call(car_step_func(), messages, repeat)),
+        ('telemetry.record', time_per_call(lambda row: lcl_telemetry.record(*row), telemetry_rows, repeat)),
+    ]
+
+
+def histogram(values, edges):
+    # Function to count values (ms) into the bins given by their upper edges, with a final bin for anything larger
+    counts = [0] * (len(edges) + 1)
+    for value in values:
+        index = 0
+        while index < len(edges) and value > edges[index]:
+            index += 1
+        counts[index] += 1
+    return counts
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def loop_benchmarks(duration, seed):
+    # Function to run the Controller and Car programs in the simulator, recording the real time spent on each loop iteration
+    # Returns the simulation and a dictionary of iteration times (ms) for each device
+    generator = random.Random(seed)
+    sim = Simulation(square_wave(), [generator.randint(0, 1023) for index in range(3)], forward=True)
+    for device in (sim.controller, sim.car):
+        device.turn_times = []
+    sim.run(duration * 1000)
+    return sim, {device.name: [value * 1000 for value in device.turn_times[1:]] for device in (sim.controller, sim.car)}
+    # The first turn includes importing the program's modules so is left out
+
+
+def print_histogram(counts, edges):
+    labels = ['<= {} ms'.format(edge) for edge in edges] + ['> {} ms'.format(edges[-1])]
+    total = max(sum(counts), 1)
+    for label, count in zip(labels, counts):
+        if count:
+            print("  {:>12} {:>8} {}".format(label, count, '#' * max(1, round(40 * count / total))))
+
+
+def read_results(path):
+    # Function to read the results saved by a previous run, returns a dictionary of name to value
+    results = {}
+    with open(path) as file:
+        next(file, None)
+        for line in file:
+            name, value, unit = line.rstrip('\n').rsplit(',', 2)
+            results[name] = float(value)
+    return results
+
+# ========== Main Program
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the message handling and loop timing of the Controller and Car programs on desktop Python.')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing runs per micro benchmark, the best is kept.')
+    parser.add_argument('--duration', type=float, default=60, help='Simulated time the programs are run for (s).')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='CSV file the results are written to, for comparing later runs with --baseline.')
+    parser.add_argument('--baseline', help='CSV file from an earlier run. Results slower by more than --tolerance are reported as regressions.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Fractional slow down allowed before a result counts as a regression.')
+    args = parser.parse_args()
+
+    results = []
+
+    # ========== Micro Benchmarks
+    print("{:<30} {:>12} {:>14}".format('Operation', 'Time [us]', 'Calls/s'))
+    for name, seconds in micro_benchmarks(args.repeat, args.seed):
+        print("{:<30} {:>12.2f} {:>14.0f}".format(name, seconds * 1e6, 1 / seconds))
+        results.append((name, seconds * 1e6, 'us'))
+
+    # ========== Loop Benchmarks
+    sim, loop_times = loop_benchmarks(args.duration, args.seed)
+    for name, times in loop_times.items():
+        over = sum(1 for value in times if value > loop_budget[name])
+        print("\n{}: {} iterations, mean {:.3f} ms, p50 {:.3f} ms, p99 {:.3f} ms, max {:.3f} ms, over the {} ms budget: {}".format(
+              name, len(times), sum(times) / max(len(times), 1), percentile(times, 0.5), percentile(times, 0.99), max(times, default=0), loop_budget[name], over))
+        print_histogram(histogram(times, histogram_edges), histogram_edges)
+        results.append((name + ' loop p99', percentile(times, 0.99) * 1000, 'us'))
+
+    # Histograms kept by the Car program itself, in simulated milliseconds
+    print("\ncar jitter histogram (ms late): {}".format(sim.car.namespace['jitter_hist']))
+    print("car busy histogram (ms): {}".format(sim.car.namespace['busy_hist']))
+    print("car overruns: {}".format(sim.car.namespace['overrun_count']))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write('name,value,unit\n')
+            for name, value, unit in results:
+                file.write('{},{:.6g},{}\n'.format(name, value, unit))
+
+    if args.baseline:
+        baseline = read_results(args.baseline)
+        regressions = [(name, baseline[name], value) for name, value, unit in results if name in baseline and value > baseline[name] * (1 + args.tolerance)]
+        for name, old, new in regressions:
+            print("Regression: {} {:.3g} -> {:.3g} ({:+.0%})".format(name, old, new, new / old - 1))
+        if regressions:
+            raise SystemExit(1)
+        print("No regressions against {}".format(args.baseline))
@@ -1,13 +1,43 @@
 # Description: Program to run on the Microbit that receives the message sent from the Controller program. The message should be decoded, and the appropriate pins should be activated. Steering requests should be put through a PID algorithm.
 # Author: Sonny Rickwood
-# Version: 20230406-1352
+# Version: 20261018-1130
 
 # ========== Library Imports
 from microbit import *
+from machine import unique_id
 import radio
+import protocol
+import telemetry
+from pid import PID, limit_func
+from plant import plant_step, steering_pins, steering_min, steering_max, steering_centre
 
 # ========== Microbit Config
 radio.config(group=25, power=7, length=128, data_rate=radio.RATE_1MBIT)
+radio.on()
+car_address = protocol.device_address(unique_id()) # Address the controller sends this car's messages to
+
+# ========== Pairing Procedure
+# Similar to the launch confirmation in acquisition.py. The car waits for a controller's pair request,
+# then pairing is confirmed by pressing button A on the car. Only messages addressed to this car are acted on afterwards
+# so several controller/car pairs can share the radio group. Pair one car at a time as the car pairs with the last request heard
+# If the car restarts, its controller's next request is addressed to this car. That controller is accepted straight away without button A
+controller_address = None
+display.show(Image.NO)
+while True:
+    packet = radio.receive_bytes()
+    request = protocol.decode_pair(packet, protocol.flag_pair_request)
+    if request is not None and protocol.accepts(packet, car_address):
+        controller_address = request # Request from the controller this car was paired with before restarting
+        radio.send_bytes(protocol.encode_pair_accept(controller_address, car_address))
+        break
+    if request is not None and protocol.accepts(packet, protocol.broadcast_address):
+        controller_address = request
+        display.show(Image.YES) # Pair request heard, waiting for button A
+    if controller_address is not None and button_a.was_pressed():
+        radio.send_bytes(protocol.encode_pair_accept(controller_address, car_address))
+        break
+    sleep(10)
+
 display.off() # Required to use ADC pins
 
 # ========== Pin Map
@@ -18,10 +48,17 @@ right_p = pin3 # Steering Right [Smaller Steering Value] (Green)
 left_p = pin4 # Steering Left [Larger Steering Value] (White)
 
 # ========== Steering Configuation
-# Configurations to limit the steering due to physical steering column limits
-steering_max = 850
-steering_min = 200
-steering_pos = (steering_max - steering_min)/2 + steering_min # Used for simulation and setting default steering position
+# The limits of the physical steering column (steering_min/max) are set in plant.py
+steering_pos = steering_centre # Used for simulation and setting default steering position
+
+# ========== Telemetry Config
+# Each loop is recorded without formatting, only every telemetry_decimation'th record is printed (see telemetry.py)
+# Button B dumps the last telemetry_history records. Set the level to telemetry.level_debug to print every loop as before
+telemetry_level = telemetry.level_info
+telemetry_decimation = 50 # Every 0.5 s at the fixed loop rate
+telemetry_history = 32
+car_telemetry = telemetry.Telemetry('car', ['Req', 'Pos', 'Adj', 'P', 'I', 'D', 'Left', 'Right', 'Forward', 'Backward', 'Overruns'],
+                                    telemetry_level, telemetry_decimation, telemetry_history, output=print)
 
 # ========== Lambda Declaration
 # Lambda declaration for converting a value from one range to another. Used for the gain values
@@ -31,147 +68,107 @@ mapping = lambda value, InitMin, InitMax, NewMin, NewMax : (((NewMax - NewMin)/(
 similation_status = False # Variable to determine whether or not to run simulation
 
 # ========== Function Declaration
-def steering_sim(left, right, lcl_steering_pos):
-    # Local parameters determing simulation speed and adjustment speed of steering
-    simulationSpeed = 200
-    maxSteeringAdj = 100
-    minSteeringAdj = -100
-    
+def steering_sim(left, right, lcl_steering_pos, delta_time):
     # Code to check if dual input has been detected. 
     # If so code is halted and error message is displayed
-    # Else next iteration of simulation is ran
+    # Else the steering model in plant.py is moved on by the time since the last call (delta_time)
     if bool(left) & bool(right):
-        print("ERROR DUAL INPUT Left: {}, Right: {}".format(left, right))
+        car_telemetry.log(telemetry.level_error, "ERROR DUAL INPUT Left: {}, Right: {}".format(left, right))
         input()
     else:
-        dir = left-right # Determine the requested steering value
-        norm_dir = round(mapping(dir, -1023, 1023, minSteeringAdj, maxSteeringAdj), 2) 
-        # Convert steering request to adjustment value
-        # Then make sure min/max adjustment value is not exceeded
-        if norm_dir > maxSteeringAdj:
-            norm_dir = maxSteeringAdj
-        elif norm_dir < minSteeringAdj:
-            norm_dir = minSteeringAdj
-        
-        # Adjust the simulated steering value according to the adjustment
-        lcl_steering_pos += norm_dir
+        lcl_steering_pos = plant_step(lcl_steering_pos, left, right, delta_time)
         
-        # Check to make sure the steering min/max is not exceeded
-        if lcl_steering_pos > 1023:
-            print("Steering Max Exceeded")
-        elif lcl_steering_pos < 0:
-            print("Steering Min Exceeded")
+        # Check to make sure the steering min/max is not exceeded. The model holds the position at the potentiometer range
+        if lcl_steering_pos >= 1023:
+            car_telemetry.log(telemetry.level_info, "Steering Max Exceeded")
+        elif lcl_steering_pos <= 0:
+            car_telemetry.log(telemetry.level_info, "Steering Min Exceeded")
         
-        # Precents the simulation from running too quickly
-        sleep(simulationSpeed)
         return lcl_steering_pos
 
 # ========== PID Code
-# Initally set values to 0 if no value is obtained from controller
-gbl_eP = 0
-gbl_eI = 0
-gbl_eD = 0
-prev_timestamp = 0
+# Gains are initally 0 until a value is obtained from controller
+# The derivative is filtered as the steering potentiometer reading is noisy at the fixed loop rate
+steering_pid = PID(0, 0, 0, output_min=-1023, output_max=1023, derivative_filter=0.5)
+prev_timestamp = running_time()
+
+# ========== Scheduler Config
+# The control loop runs at a fixed rate whether or not a message has been received
+loop_period = 10 # Time between control loop iterations (ms)
+failsafe_timeout = 500 # Drive pins are turned off if no message is received for this long (ms)
+overrun_count = 0 # Number of iterations that took longer than loop_period
+
+# ========== Loop Profiling
+# Histograms of the loop timing, logged with the telemetry dump when button B is pressed. Index n counts iterations of n ms, the last bin counts anything longer
+# jitter_hist: how late each iteration started compared to its schedule. busy_hist: time spent on each iteration before waiting
+histogram_bins = 12
+jitter_hist = [0] * histogram_bins
+busy_hist = [0] * histogram_bins
 
-def PID_algorithm(target, position, integral_error, delta_time, prev_error, Kp, Ki, Kd):
-    # Determing the adjustment to be made to steering via a PID algorithm
-    error = target - position # Proportional: Get the error value between the target/requested and the actual position
-    integral_error += (error * delta_time) # Integral: Times the error by the time between iterations. Add the value to global variable.
-    derivative_error = (error - prev_error)/ delta_time # Derivative: Calculate the rate the algorithm is adjusting
+# ========== Main Code 
+last_seq = -1 # Sequence number of the last message received
+last_message_time = running_time() # Time the last valid message was received
 
-    output = (Kp * error) + (Ki * integral_error) + (Kd * derivative_error) # Sum the error values timesed by their gain values
-    return output, error, integral_error, derivative_error
+# ========== Request Declaration
+# The requested and gain values are kept between messages
+# The controller only sends when a value changes (or to keep the connection alive) so the last known values stay in use
+requ_steer = 0
+norm_requ_steer = 0
 
-# ========== Function Declaration
-def limit_func(target, min, max):
-    # Function to limit a value to a range
-    if target > max:
-        return max
-    elif target < min:
-        return min
-    else:
-        return target
+Gp = 0
+Gi = 0
+Gd = 0
 
-# ========== Main Code 
-while True:
-    # ========== Variable Reset
-    # Clear the requested, gain and pin values.
-    controls = "" 
-    requ_steer = 0
-    norm_requ_steer = 0
-    
-    Gp = 0
-    Gi = 0
-    Gd = 0
+forw_value = 0
+back_value = 0
 
-    forw_value = 0
-    back_value = 0
-    left_value = 0
-    right_value = 0
+next_tick = running_time() # Time the next iteration is due
+
+while True:
+    loop_start = running_time()
+    jitter_hist[limit_func(loop_start - next_tick, 0, histogram_bins - 1)] += 1
 
     # ========== Radio Message Detection
-    while True:
-        # Keep looping until a Radio message is received
-        controls = radio.receive()
-        if controls:
-            break
-    controls = controls.strip('{').strip('}').split(',')
-
-    # ========== Message Assignment
-    for i, cont in enumerate(controls):
-        # Assign requested values from Radio message to apppropriate local values
-        if 'Gd' in cont:
-            temp = cont.split(':')
-            Gd = float(temp[1])
-            
-        if 'f' in cont:
-            temp = cont.split(':')
-            forw_value = int(temp[1])
-
-        if 's' in cont:
-            temp = cont.split(':')
-            requ_steer = mapping(int(temp[1]), -1023, 1023, steering_min, steering_max)
+    # Reads every waiting message without blocking so only the most recent request is used
+    # Messages for other cars are dropped from their header. Messages that cannot be decoded or repeat the last sequence number are ignored
+    packet = radio.receive_bytes()
+    while packet:
+        if not protocol.accepts(packet, car_address):
+            if protocol.decode_pair(packet, protocol.flag_pair_request) == controller_address:
+                # The paired controller has restarted and is pairing again, so the acceptance is repeated
+                radio.send_bytes(protocol.encode_pair_accept(controller_address, car_address))
+            packet = radio.receive_bytes()
+            continue
+        message = protocol.decode(packet)
+        if message and message[0] != last_seq:
+            # ========== Message Assignment
+            # Assign requested values from Radio message to apppropriate local values
+            last_seq, forw_value, back_value, requ_steer, Gp, Gi, Gd = message
+            steering_pid.set_gains(Gp, Gi, Gd)
+            requ_steer = mapping(requ_steer, -1023, 1023, steering_min, steering_max)
             norm_requ_steer = limit_func(requ_steer, steering_min, steering_max)
             # Converts requested steering to local steering limits to prevent requests above steering min/max
+            last_message_time = running_time()
+        packet = radio.receive_bytes()
 
-        if 'Gi' in cont:
-            temp = cont.split(':')
-            Gi = float(temp[1])
+    # ========== Failsafe
+    # Stops the car if the controller has not been heard from within the timeout
+    if running_time() - last_message_time > failsafe_timeout:
+        forw_value = 0
+        back_value = 0
 
-        if 'Gp' in cont:
-            temp = cont.split(':')
-            Gp = float(temp[1])
-
-        if 'b' in cont:
-            temp = cont.split(':')
-            back_value = int(temp[1])
-
-    
     # ========== PID Config
     curr_timestamp = running_time()
     deltaT = curr_timestamp - prev_timestamp
     prev_timestamp = curr_timestamp
     # Gets the delta time for the PID algorithm and sets variables for next iteration
 
-    adjustment, gbl_eP, gbl_eI, gbl_eD = PID_algorithm(norm_requ_steer, steering_pos, gbl_eI, deltaT, gbl_eP, Gp, Gi, Gd)
+    adjustment = steering_pid.update(norm_requ_steer, steering_pos, deltaT)
 
     # ========== Steering Adjustments
-    # Sets the left or right value according to the adjustment value returned from the PID algorithm
+    # Sets the left or right value according to the adjustment value returned from the PID algorithm (see steering_pins() in plant.py)
     # Unless the steering min/max is excessed which results in the opposing value to be assigned
-    if adjustment > 0:
-        if steering_pos > steering_max:
-            right_value = adjustment
-        else:
-            left_value = adjustment  
-    elif adjustment < 0:
-        if steering_pos < steering_min:
-            left_value = adjustment
-        else:
-            right_value = adjustment
-
-    # Limits the value to ensure pins can be assigned the value
-    left_value = limit_func(int(abs(left_value)), 0, 1023)
-    right_value = limit_func(int(abs(right_value)), 0, 1023)
+    left_value, right_value = steering_pins(adjustment, steering_pos)
     
     # ========== Pin Assignment
     # Sets the pins accordingly
@@ -187,10 +184,27 @@ while True:
 
     if similation_status == True:
         # Run simulation and correct steering_pos according to simulation
-        steering_pos = steering_sim(left_value, right_value, steering_pos)
+        steering_pos = steering_sim(left_value, right_value, steering_pos, deltaT)
     else:
         # Else read the steering position
         steering_pos = steering_pin.read_analog()
 
     # ========== Code Debugging
-    print("Req: {}, Pos: {}, Adj: {}, P: {}, I: {}, D: {}, Left: {}, Right: {}, Forward: {}, Backward: {}".format(norm_requ_steer, steering_pos, adjustment, gbl_eP * Gp, gbl_eI * Gi, gbl_eD * Gd, left_value, right_value, forw_value, back_value)) # Prints values for debugging purposes
\ No newline at end of file
+    car_telemetry.record(norm_requ_steer, steering_pos, adjustment, steering_pid.error * Gp, steering_pid.integral_error * Gi, steering_pid.derivative_error * Gd, left_value, right_value, forw_value, back_value, overrun_count)
+    # Records values for debugging purposes
+
+    if button_b.was_pressed():
+        car_telemetry.dump()
+        car_telemetry.log(telemetry.level_info, "Jitter: {}, Busy: {}".format(jitter_hist, busy_hist))
+
+    # ========== Loop Timing
+    # Waits until the next iteration is due. If it is already overdue the overrun is counted
+    # and the schedule restarts from now rather than running several iterations back to back
+    busy_hist[limit_func(running_time() - loop_start, 0, histogram_bins - 1)] += 1
+    next_tick += loop_period
+    wait_time = next_tick - running_time()
+    if wait_time > 0:
+        sleep(wait_time)
+    else:
+        overrun_count += 1
+        next_tick = running_time()
\ No newline at end of file
@@ -1,55 +1,135 @@
 # Description: A program capable of obtaining gain values, steering and forward/backward requests for the car. The requests will then be radioed to the other Microbit.
 # Author: Sonny Rickwood
-# Version: 20230406-1352
+# Version: 20261018-1130
 
 # ========== Library Imports
 from microbit import *
+from machine import unique_id
 import radio
+import protocol
+import gains
+import telemetry
 
 # ========== Microbit Config
 radio.config(group=25, power=7, length=128, data_rate=radio.RATE_1MBIT)
+radio.on()
 # Configuring Microbit radio to allow for message to be sent
+controller_address = protocol.device_address(unique_id()) # Address the paired car sends its pairing acceptance to
+pair_request_period = 250 # Time between pair requests while waiting for a car (ms)
+repair_period = 1000 # Time between the pair requests sent to the paired car while running (ms), so it pairs again if it restarts
 
-# ========== Function Declaration
-mapping = lambda value, InitMin, InitMax, NewMin, NewMax : (((NewMax - NewMin)/(InitMax - InitMin)) * (value - InitMax)) + NewMax
-# Lambda declaration for converting a value from one range to another. Used for the gain values
+# ========== Send Policy Config
+# Messages are only sent when a request changes by more than its deadband, or when the keepalive period has passed
+# This reduces radio traffic when several cars share the same group
+steer_deadband = 16 # Change in steering request (milliG) needed before a message is sent
+gain_hysteresis = 2 # Potentiometer readings past the edge of the current table index needed before a new gain is looked up and sent
+# Stops noise on a reading at the edge of an index from switching between two gains, while every index including the ends can still be reached
+keepalive_period = 250 # Maximum time between messages (ms) so the car knows the controller is still connected
+
+# ========== Gain Config
+# Potentiometer pins for each gain. Gain values are looked up from the tables in gains.py, built once at startup
+gain_pins = {'Gp': pin0, 'Gi': pin1, 'Gd': pin2}
+send_gain_index = False # Send the table indexes instead of the gain values. The car looks the gains up from the same tables
+
+# ========== Telemetry Config
+# Each message sent is recorded without formatting, only every telemetry_decimation'th record is printed (see telemetry.py)
+# Pressing buttons A and B together dumps the last telemetry_history records, and stops the car while they are held
+telemetry_level = telemetry.level_info
+telemetry_decimation = 10
+telemetry_history = 32
+controller_telemetry = telemetry.Telemetry('controller', ['Seq', 'Forward', 'Backward', 'Steering', 'Gp', 'Gi', 'Gd'],
+                                           telemetry_level, telemetry_decimation, telemetry_history, output=print)
+dump_pressed = False # Whether both buttons were held on the previous loop, so each press only dumps once
+
+# ========== Pairing Procedure
+# Similar to the launch confirmation in acquisition.py. Pair requests are sent until a car accepts,
+# which happens when button A is pressed on the car. Every message afterwards is addressed to that car only
+# While running, a pair request addressed to the paired car is sent every repair_period. A car that has restarted
+# is waiting to pair again, and accepts a request addressed to it without button A being pressed
+car_address = None
+last_request = -pair_request_period
+display.show(Image.NO)
+while car_address is None:
+    if running_time() - last_request >= pair_request_period:
+        radio.send_bytes(protocol.encode_pair_request(controller_address))
+        last_request = running_time()
+    packet = radio.receive_bytes()
+    if protocol.accepts(packet, controller_address):
+        car_address = protocol.decode_pair(packet, protocol.flag_pair_accept)
+    sleep(10)
+display.show(Image.YES)
+controller_telemetry.log(telemetry.level_info, "Paired with car {}".format(car_address))
 
 # ========== Main Code
-while True:
-    # ========== Dictionary Declaration
-    # Dictionary containing requested values from the controller
-    controls = {
-        'f': 0, 
-        'b': 0, 
-        's':accelerometer.get_x(),
-        'Gp': pin0.read_analog(),
-        'Gi': pin1.read_analog(),
-        'Gd': pin2.read_analog()
-    }
+seq = 0 # Sequence number sent with each message so the car can detect repeated or missing messages
+last_send = -keepalive_period # Time the last message was sent, set so the first loop always sends
+last_request = running_time() # Time the last pair request was sent
 
+# Dictionary containing the last requested values sent to the car
+controls = {'f': 0, 'b': 0, 's': 0, 'Gp': 0, 'Gi': 0, 'Gd': 0}
+# Dictionary containing the table index of each current gain. Starts out of range so the first loop looks up every gain
+gain_indexes = {'Gp': -gains.table_size, 'Gi': -gains.table_size, 'Gd': -gains.table_size}
+index_width = 1 << gains.index_shift # Potentiometer readings covered by each table index
+
+while True:
+    changed = False
+    
     # ========== Gain Adjustments
-    # Adjusting the Gain values to better suit their effect on the PID algorithm
-    controls['Gp'] = round(mapping(controls['Gp'], 0, 1023, 1, 10), 2)
-    controls['Gi'] = 10 ** (-1 * round(mapping(controls['Gi'], 0, 1023, 6, 0), 2))
-    controls['Gd'] = 10 ** (round(mapping(controls['Gd'], 0, 1023, 0, 5), 2))
+    # Gains are only looked up again when their potentiometer has moved out of the current index's readings by more than the hysteresis
+    for key in gain_pins:
+        reading = gain_pins[key].read_analog()
+        index_start = gain_indexes[key] * index_width
+        if reading < index_start - gain_hysteresis or reading >= index_start + index_width + gain_hysteresis:
+            gain_indexes[key] = gains.gain_index(reading)
+            controls[key] = gains.tables[key][gain_indexes[key]]
+            changed = True
 
     # ========== Steering Limits
     # Limits the steering to +/- 1023 to prevent PID algorithm exceeding values
-    if controls['s'] < -1023:
-        controls['s'] = -1023
-    elif controls['s'] > 1023:
-        controls['s'] = 1023
+    steer = accelerometer.get_x()
+    if steer < -1023:
+        steer = -1023
+    elif steer > 1023:
+        steer = 1023
+    
+    if abs(steer - controls['s']) > steer_deadband:
+        controls['s'] = steer
+        changed = True
 
     # ========== Direction Adjustment
     # Adjusts forward/backward requests according to buttons pressed
-    if button_b.is_pressed():
-        controls['f'] = 1
-    elif button_a.is_pressed():
-        controls['b'] = 1
+    # Holding both buttons dumps the telemetry instead, and requests neither direction so the car is not driven
+    a_pressed, b_pressed = button_a.is_pressed(), button_b.is_pressed()
+    both_pressed = a_pressed and b_pressed
+    forward, backward = 0, 0
+    if b_pressed and not both_pressed:
+        forward = 1
+    elif a_pressed and not both_pressed:
+        backward = 1
+    
+    if both_pressed and not dump_pressed:
+        controller_telemetry.dump()
+    dump_pressed = both_pressed
+    
+    if forward != controls['f'] or backward != controls['b']:
+        controls['f'], controls['b'] = forward, backward
+        changed = True
 
-    radio.send(str(controls))
+    # ========== Message Sending
+    # Sends the requested values if any have changed or the keepalive period has passed
+    if changed or running_time() - last_send >= keepalive_period:
+        if send_gain_index:
+            radio.send_bytes(protocol.encode_indexed(car_address, seq, controls['f'], controls['b'], controls['s'], gain_indexes['Gp'], gain_indexes['Gi'], gain_indexes['Gd']))
+        else:
+            radio.send_bytes(protocol.encode(car_address, seq, controls['f'], controls['b'], controls['s'], controls['Gp'], controls['Gi'], controls['Gd']))
+        controller_telemetry.record(seq, controls['f'], controls['b'], controls['s'], controls['Gp'], controls['Gi'], controls['Gd'])
+        # Records the values sent for debugging
+        seq = (seq + 1) & 0xFF
+        last_send = running_time()
+    elif running_time() - last_request >= repair_period:
+        # Pair requests are only sent on loops without a request message, so the car's receive queue is not filled by both at once
+        radio.send_bytes(protocol.encode_pair_request(controller_address, car_address))
+        last_request = running_time()
+    
     sleep(20)
-    # Sends the requested values and delays from program to restrict message requests
-
-    print("Forward: {}, Backward: {}, Steering: {}, Gp: {}, Gi: {}, Gd: {}".format(controls['f'], controls['b'], controls['s'], controls['Gp'], controls['Gi'], controls['Gd']))
-    # Prints for debugging
\ No newline at end of file
+    # Delays program to restrict how often inputs are checked
@@ -0,0 +1,35 @@
+# Description: Gain lookup tables shared by the Controller and Car programs. Gains are calculated once at startup for every quantized potentiometer reading so the control loops only do a table lookup.
+# Version: 20261017-1100
+
+# ========== Library Imports
+from array import array
+
+# ========== Lambda Declaration
+# Lambda declaration for converting a value from one range to another. Used for the gain values
+mapping = lambda value, InitMin, InitMax, NewMin, NewMax : (((NewMax - NewMin)/(InitMax - InitMin)) * (value - InitMax)) + NewMax
+
+# Lambda declarations adjusting the Gain values to better suit their effect on the PID algorithm
+# Gp: 1 to 10, Gi: 1e-6 to 1 (log scale), Gd: 1 to 1e5 (log scale)
+gain_calc = {
+    'Gp': lambda value: round(mapping(value, 0, 1023, 1, 10), 2),
+    'Gi': lambda value: 10 ** (-1 * round(mapping(value, 0, 1023, 6, 0), 2)),
+    'Gd': lambda value: 10 ** (round(mapping(value, 0, 1023, 0, 5), 2))
+}
+
+# ========== Table Config
+index_shift = 2 # Potentiometer readings (0-1023) are shifted right by this to get the table index
+table_size = 1024 >> index_shift # 256 entries per gain, the index fits in a single byte
+
+# ========== Function Declaration
+def gain_index(reading):
+    # Function to quantize a potentiometer reading to a table index
+    return reading >> index_shift
+
+
+def build_table(calc):
+    # Function to calculate a gain for every table index
+    # The first and last index use the min/max readings so the full gain range is covered
+    return array('f', [calc(round(index * 1023 / (table_size - 1))) for index in range(table_size)])
+
+# ========== Table Declaration
+tables = {key: build_table(gain_calc[key]) for key in gain_calc}
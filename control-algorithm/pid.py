@@ -0,0 +1,72 @@
+# Description: PID controller shared by the Car program and the desktop simulation/tuning tools. Written so update() does not allocate, making it suitable for the fixed rate control loop on the Microbit.
+# Version: 20261017-1300
+
+# ========== Function Declaration
+def limit_func(target, min, max):
+    # Function to limit a value to a range
+    if target > max:
+        return max
+    elif target < min:
+        return min
+    else:
+        return target
+
+# ========== Class Declaration
+class PID:
+    # PID controller with integral clamping (anti-windup), a low pass filter on the derivative and output saturation
+    # __slots__ prevents an attribute dictionary being created for each object on desktop Python. MicroPython ignores it
+    __slots__ = ('Kp', 'Ki', 'Kd', 'output_min', 'output_max', 'integral_min', 'integral_max', 'derivative_filter',
+                 'error', 'integral_error', 'derivative_error', 'primed')
+
+    def __init__(self, Kp=0, Ki=0, Kd=0, output_min=-1023, output_max=1023, derivative_filter=1):
+        # output_min/output_max: bounds the output is saturated to, the same bounds the steering pins are limited to
+        # derivative_filter: weighting (0-1) of the newest derivative value. 1 disables filtering, smaller values filter more
+        self.output_min = output_min
+        self.output_max = output_max
+        self.derivative_filter = derivative_filter
+        self.reset()
+        self.set_gains(Kp, Ki, Kd)
+
+    def set_gains(self, Kp, Ki, Kd):
+        # Stores the gains and works out the integral limits
+        # The integral is clamped so the integral term alone can never exceed the output bounds
+        self.Kp = Kp
+        self.Ki = Ki
+        self.Kd = Kd
+
+        if Ki > 0:
+            self.integral_min = self.output_min / Ki
+            self.integral_max = self.output_max / Ki
+        else:
+            self.integral_min = 0
+            self.integral_max = 0
+
+        if self.primed:
+            self.integral_error = limit_func(self.integral_error, self.integral_min, self.integral_max)
+
+    def reset(self):
+        # Clears the error values, e.g. after the car has been stopped by the failsafe
+        self.error = 0
+        self.integral_error = 0
+        self.derivative_error = 0
+        self.primed = False # False until the first update, as there is no previous error to get a derivative from
+
+    def update(self, target, position, delta_time):
+        # Returns the saturated adjustment for the steering
+        # The individual error values are kept as attributes for debugging
+        error = target - position # Proportional: Get the error value between the target/requested and the actual position
+
+        if delta_time > 0:
+            # Integral and derivative are only updated when time has passed, avoiding a divide by zero
+            self.integral_error = limit_func(self.integral_error + (error * delta_time), self.integral_min, self.integral_max)
+            # Integral: Times the error by the time between iterations and add it to the running total, within the clamp
+
+            if self.primed:
+                # Derivative: Calculate the rate the error is changing, filtered to reduce noise from the steering potentiometer
+                self.derivative_error += self.derivative_filter * (((error - self.error) / delta_time) - self.derivative_error)
+            self.primed = True
+
+        self.error = error
+
+        output = (self.Kp * error) + (self.Ki * self.integral_error) + (self.Kd * self.derivative_error) # Sum the error values timesed by their gain values
+        return limit_func(output, self.output_min, self.output_max)
@@ -0,0 +1,39 @@
+# Description: Model of the car's steering and the conversion of PID adjustments to steering pin values. Shared by the Car program (for steering_sim() and its pin writes) and the desktop simulation, tuning and benchmark tools so they all follow the same logic.
+# Version: 20261018-1100
+
+# ========== Library Imports
+from pid import limit_func
+
+# ========== Steering Configuation
+steering_max = 850 # Steering limits used by the Car program
+steering_min = 200
+steering_centre = (steering_max - steering_min)/2 + steering_min
+
+max_steering_adj = 100 # Change in steering position at full drive over one adjustment period
+adjustment_period = 200 # Adjustment period (ms)
+
+# ========== Function Declaration
+def plant_step(position, left, right, delta_time):
+    # Function to move the steering position according to the left/right pin values over delta_time (ms)
+    # Left increases the position, right decreases it. The position is held within the potentiometer range (0-1023)
+    position += ((left - right) / 1023) * max_steering_adj * delta_time / adjustment_period
+    return limit_func(position, 0, 1023)
+
+
+def steering_pins(adjustment, position):
+    # Function to convert a PID adjustment to the left and right steering pin values at the current steering position
+    # Positive adjustments drive left and negative drive right, unless the steering min/max is exceeded which results in the opposing pin being driven
+    # Values are limited to ensure the pins can be assigned them
+    left_value, right_value = 0, 0
+    if adjustment > 0:
+        if position > steering_max:
+            right_value = adjustment
+        else:
+            left_value = adjustment
+    elif adjustment < 0:
+        if position < steering_min:
+            left_value = adjustment
+        else:
+            right_value = adjustment
+    
+    return limit_func(int(abs(left_value)), 0, 1023), limit_func(int(abs(right_value)), 0, 1023)
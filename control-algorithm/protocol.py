@@ -0,0 +1,106 @@
+# Description: Radio message format shared by the Controller and Car programs. Requests are packed into fixed layout bytes so they are quick to send and decode on the Microbit, and can be tested on desktop Python. Messages are addressed to a single car so several controller/car pairs can share the same radio group.
+# Version: 20261018-1130
+
+# ========== Library Imports
+try:
+    import struct
+except ImportError:
+    import ustruct as struct # MicroPython name for the struct module
+import gains
+
+# ========== Message Format
+message_version = 2 # Increased whenever the layout changes so old messages are ignored rather than misread
+# Every message starts with the version then the address of the device it is for, so a receiver can drop
+# messages for other devices from the first two bytes without unpacking the rest (see accepts())
+message_format = '<BBBBhfff'
+# Layout (little endian): version, address, sequence number, flags, steering request, Gp, Gi, Gd
+message_size = struct.calcsize(message_format)
+
+indexed_format = '<BBBBhBBB'
+# Layout used when flag_gain_index is set: the gains are sent as indexes into the tables in gains.py
+indexed_size = struct.calcsize(indexed_format)
+
+pair_format = '<BBBBB'
+# Layout of the pairing messages: version, address, sequence number (unused), flags, address of the sender
+pair_size = struct.calcsize(pair_format)
+
+flag_forward = 1 # Drive flag bits
+flag_backward = 2
+flag_gain_index = 4 # Set when the gains are sent as table indexes
+flag_pair_request = 8 # Controller asking any unpaired car, or the car it is paired with, to pair with it
+flag_pair_accept = 16 # Car accepting a pair request
+
+# ========== Address Config
+broadcast_address = 255 # Address of messages for every device, used by pair requests before a car is paired
+# Device addresses are 1 to 254, 0 is left unused so a blank message is never accepted
+
+# ========== Function Declaration
+def device_address(unique_id):
+    # Function to get the address of a Microbit from its unique ID (machine.unique_id())
+    # Two devices in a fleet may share an address by chance (1 in 254), only pairing is affected
+    total = 0
+    for byte in unique_id:
+        total = (total * 31 + byte) & 0xFFFF
+    return 1 + (total % 254)
+
+
+def accepts(message, address):
+    # Function to check a received message is this version and addressed to address, from the header bytes only
+    return bool(message) and len(message) >= 4 and message[0] == message_version and message[1] == address
+
+
+def encode(address, seq, forward, backward, steer, Gp, Gi, Gd):
+    # Function to pack the controller requests for the car at address into a message
+    # The sequence number wraps around at 256
+    flags = (flag_forward if forward else 0) | (flag_backward if backward else 0)
+    return struct.pack(message_format, message_version, address, seq & 0xFF, flags, steer, Gp, Gi, Gd)
+
+
+def encode_indexed(address, seq, forward, backward, steer, Gp_index, Gi_index, Gd_index):
+    # Function to pack the controller requests into a message with the gains sent as table indexes
+    # The receiver rebuilds the gains from the same tables, saving 9 bytes per message
+    flags = (flag_forward if forward else 0) | (flag_backward if backward else 0) | flag_gain_index
+    return struct.pack(indexed_format, message_version, address, seq & 0xFF, flags, steer, Gp_index, Gi_index, Gd_index)
+
+
+def encode_pair_request(source, address=broadcast_address):
+    # Function to pack a pair request from the controller at source, sent to every device
+    # Once paired the controller addresses its requests to its car only, so a car that has restarted can pair again (see car.py)
+    return struct.pack(pair_format, message_version, address, 0, flag_pair_request, source)
+
+
+def encode_pair_accept(address, source):
+    # Function to pack the reply of the car at source accepting the pair request of the controller at address
+    return struct.pack(pair_format, message_version, address, 0, flag_pair_accept, source)
+
+
+def decode(message):
+    # Function to unpack a request message into seq, forward, backward, steer, Gp, Gi, Gd
+    # Gains sent as table indexes are looked up so both layouts decode the same way
+    # Returns None if the message is missing, the wrong size, a different version or a pairing message
+    # The address is not checked here, receivers check it with accepts() first
+    if not message or len(message) < 4 or message[0] != message_version:
+        return None
+
+    if message[3] & (flag_pair_request | flag_pair_accept):
+        return None
+
+    if message[3] & flag_gain_index:
+        if len(message) != indexed_size:
+            return None
+        version, address, seq, flags, steer, Gp, Gi, Gd = struct.unpack(indexed_format, message)
+        Gp, Gi, Gd = gains.tables['Gp'][Gp], gains.tables['Gi'][Gi], gains.tables['Gd'][Gd]
+    else:
+        if len(message) != message_size:
+            return None
+        version, address, seq, flags, steer, Gp, Gi, Gd = struct.unpack(message_format, message)
+
+    return seq, flags & flag_forward, (flags & flag_backward) >> 1, steer, Gp, Gi, Gd
+
+
+def decode_pair(message, flag):
+    # Function to get the sender's address from a pairing message with the given flag (flag_pair_request or flag_pair_accept)
+    # Returns None for any other message
+    if not message or len(message) != pair_size or message[0] != message_version or not (message[3] & flag):
+        return None
+    return message[4]
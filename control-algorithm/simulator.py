@@ -0,0 +1,507 @@
+# Description: Desktop simulation of the Controller and Car programs. Both programs run unchanged against stand-ins for the microbit and radio modules, sharing a simulated clock and radio, with the car's steering driven by the model in plant.py.
+# Version: 20261017-2100
+
+# ========== Library Imports
+import argparse
+import builtins
+import hashlib
+import math
+import os
+import sys
+import threading
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__))) # Programs import protocol, pid and gains from this folder
+from plant import plant_step, steering_min, steering_max, steering_centre
+
+# ========== Lambda Declaration
+# Lambda declaration for converting a value from one range to another
+mapping = lambda value, InitMin, InitMax, NewMin, NewMax : (((NewMax - NewMin)/(InitMax - InitMin)) * (value - InitMax)) + NewMax
+
+# ========== Class Declaration
+class SimulationEnd(BaseException):
+    # Raised inside a program when the simulation has finished
+    # BaseException so it is not caught by a program's own "except Exception"
+    pass
+
+
+class Scheduler:
+    # Simulated clock shared by every device
+    # Only one device runs at a time. When a device sleeps, the clock jumps to the next device due to wake up
+    # so no real time is spent waiting and the simulation runs as fast as the programs can execute
+
+    def __init__(self):
+        self.now = 0.0 # Simulated time (ms)
+        self.devices = []
+        self.running = None # Device currently allowed to run
+        self.stopped = False
+        self.condition = threading.Condition()
+
+    def wait_turn(self, device):
+        # Called from a device thread. Waits until the scheduler lets the device run
+        with self.condition:
+            self.condition.wait_for(lambda: self.running is device or self.stopped)
+        if self.stopped:
+            raise SimulationEnd()
+
+    def block(self, device, wake_time):
+        # Called from a device thread. Hands control back to the scheduler until wake_time
+        with self.condition:
+            device.wake_time = wake_time
+            self.running = None
+            self.condition.notify_all()
+        self.wait_turn(device)
+
+    def finish(self, device):
+        # Called from a device thread when its program has ended
+        with self.condition:
+            device.finished = True
+            self.running = None
+            self.condition.notify_all()
+
+    def run(self, duration):
+        # Runs every device until the simulated clock reaches duration (ms)
+        for device in self.devices:
+            device.start()
+
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.running is None)
+                waiting = [device for device in self.devices if not device.finished]
+                if not waiting:
+                    break
+
+                device = min(waiting, key=lambda device: device.wake_time)
+                if device.wake_time > duration:
+                    break
+
+                self.now = max(self.now, device.wake_time)
+                self.running = device
+                self.condition.notify_all()
+
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        for device in self.devices:
+            device.thread.join()
+
+
+class Pin:
+    # Stand-in for a Microbit pin
+    # Reads come from read_source if one is given, writes are passed to write_hook so models can follow them
+
+    def __init__(self, device, read_source=None):
+        self.device = device
+        self.read_source = read_source
+        self.write_hook = None
+        self.value = 0
+
+    def read_analog(self):
+        self.device.tick()
+        if self.read_source:
+            return int(self.read_source())
+        return self.value
+
+    def read_digital(self):
+        return 1 if self.read_analog() else 0
+
+    def write_analog(self, value):
+        self.device.tick()
+        if self.write_hook:
+            self.write_hook(self, value)
+        self.value = value
+
+    def write_digital(self, value):
+        self.write_analog(1 if value else 0)
+
+    def is_touched(self):
+        return False
+
+    def set_analog_period(self, period):
+        pass
+
+
+class Button:
+    # Stand-in for a Microbit button, pressed for the periods given to press()
+
+    def __init__(self, device):
+        self.device = device
+        self.periods = [] # List of (start, end) times (ms) the button is held for
+        self.counted = set()
+
+    def press(self, start, duration=100):
+        self.periods.append((start, start + duration))
+
+    def is_pressed(self):
+        self.device.tick()
+        now = self.device.scheduler.now
+        return any(start <= now < end for start, end in self.periods)
+
+    def get_presses(self):
+        # Counts each press whose start has passed since the last call
+        self.device.tick()
+        now = self.device.scheduler.now
+        new = [period for period in self.periods if period[0] <= now and period not in self.counted]
+        self.counted.update(new)
+        return len(new)
+
+    def was_pressed(self):
+        return self.get_presses() > 0
+
+
+class Accelerometer:
+    # Stand-in for the Microbit accelerometer. Each axis is a function of the simulated time (ms)
+
+    def __init__(self, device):
+        self.device = device
+        self.sources = {'x': lambda now: 0, 'y': lambda now: 0, 'z': lambda now: -1024}
+
+    def get_x(self):
+        self.device.tick()
+        return int(self.sources['x'](self.device.scheduler.now))
+
+    def get_y(self):
+        self.device.tick()
+        return int(self.sources['y'](self.device.scheduler.now))
+
+    def get_z(self):
+        self.device.tick()
+        return int(self.sources['z'](self.device.scheduler.now))
+
+    def get_values(self):
+        return self.get_x(), self.get_y(), self.get_z()
+
+    def set_range(self, value):
+        pass
+
+
+class Display:
+    # Stand-in for the Microbit display, images are recorded but not shown
+
+    def __init__(self):
+        self.image = None
+
+    def show(self, image, *args, **kwargs):
+        self.image = image
+
+    def scroll(self, text, *args, **kwargs):
+        self.image = text
+
+    def clear(self):
+        self.image = None
+
+    def on(self):
+        pass
+
+    def off(self):
+        pass
+
+
+class Image:
+    # Stand-in for Microbit images, only the names are kept
+    def __init__(self, name):
+        self.name = name
+
+    def invert(self):
+        return Image(self.name + '.invert')
+
+    def __repr__(self):
+        return 'Image.' + self.name
+
+for name in ['NO', 'YES', 'HAPPY', 'SAD', 'SQUARE', 'HEART']:
+    setattr(Image, name, Image(name))
+Image.ALL_CLOCKS = [Image('CLOCK{}'.format(hour)) for hour in range(12)]
+
+
+class Radio:
+    # Stand-in for the radio module. Messages sent are delivered to every other device on the same group
+    # Like the Microbit, each device only queues a limited number of messages and drops the rest
+    RATE_250KBIT, RATE_1MBIT, RATE_2MBIT = 0, 1, 2
+
+    def __init__(self, device, bus):
+        self.device = device
+        self.bus = bus
+        self.settings = {'group': 0, 'queue': 3, 'length': 32}
+        self.enabled = True
+        self.queue = []
+        self.sent = 0
+        self.dropped = 0
+        bus.append(self)
+
+    def config(self, **kwargs):
+        self.settings.update(kwargs)
+
+    def on(self):
+        self.enabled = True
+
+    def off(self):
+        self.enabled = False
+
+    def reset(self):
+        self.settings = {'group': 0, 'queue': 3, 'length': 32}
+
+    def send_bytes(self, message):
+        self.device.tick()
+        self.sent += 1
+        message = bytes(message)[:self.settings['length']]
+        for radio in self.bus:
+            if radio is not self and radio.enabled and radio.settings['group'] == self.settings['group']:
+                if len(radio.queue) < radio.settings['queue']:
+                    radio.queue.append(message)
+                else:
+                    radio.dropped += 1
+
+    def send(self, message):
+        self.send_bytes(b'\x01\x00\x01' + message.encode())
+
+    def receive_bytes(self):
+        self.device.tick()
+        if self.queue:
+            return self.queue.pop(0)
+        return None
+
+    def receive(self):
+        message = self.receive_bytes()
+        if message is None:
+            return None
+        return message[3:].decode()
+
+    def module(self):
+        # Builds the module a program gets from "import radio"
+        module = types.ModuleType('radio')
+        for name in ['config', 'on', 'off', 'reset', 'send', 'send_bytes', 'receive', 'receive_bytes']:
+            setattr(module, name, getattr(self, name))
+        for name in ['RATE_250KBIT', 'RATE_1MBIT', 'RATE_2MBIT']:
+            setattr(module, name, getattr(self, name))
+        return module
+
+
+class Device:
+    # A simulated Microbit running one program in its own thread
+
+    def __init__(self, scheduler, bus, name, path, verbose=False, busy_limit=1000):
+        # busy_limit: number of calls into the microbit/radio modules without a sleep before 1 ms is spent automatically
+        # Stops programs that poll in a loop from holding the clock still
+        self.scheduler = scheduler
+        self.name = name
+        self.path = path
+        self.verbose = verbose
+        self.busy_limit = busy_limit
+        self.calls = 0
+        self.wake_time = 0.0
+        self.finished = False
+        self.error = None
+        self.output = []
+        self.namespace = {} # Global variables of the program, kept so they can be inspected after the simulation
+        self.turn_times = None # Set to a list to record the real time (s) spent on each turn between sleeps
+        self.turn_start = 0.0
+        self.unique_id = hashlib.blake2b(name.encode(), digest_size=8).digest() # Returned by machine.unique_id()
+
+        self.pins = {'pin{}'.format(number): Pin(self) for number in [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 19, 20]}
+        self.button_a = Button(self)
+        self.button_b = Button(self)
+        self.accelerometer = Accelerometer(self)
+        self.display = Display()
+        self.radio = Radio(self, bus)
+
+        scheduler.devices.append(self)
+        self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+
+    def tick(self):
+        # Counts calls into the modules, spending 1 ms if the program has not slept for a while
+        self.calls += 1
+        if self.calls > self.busy_limit:
+            self.sleep(1)
+
+    def sleep(self, duration):
+        if self.turn_times is not None:
+            self.turn_times.append(time.perf_counter() - self.turn_start)
+        self.calls = 0
+        self.scheduler.block(self, self.scheduler.now + max(duration, 0))
+        self.turn_start = time.perf_counter()
+
+    def running_time(self):
+        self.tick()
+        return int(self.scheduler.now)
+
+    def microbit_module(self):
+        # Builds the module a program gets from "from microbit import *"
+        module = types.ModuleType('microbit')
+        module.__dict__.update(self.pins)
+        module.button_a = self.button_a
+        module.button_b = self.button_b
+        module.accelerometer = self.accelerometer
+        module.display = self.display
+        module.Image = Image
+        module.sleep = self.sleep
+        module.running_time = self.running_time
+        module.set_volume = lambda volume: None
+        module.temperature = lambda: 20
+        return module
+
+    def machine_module(self):
+        # Builds the module a program gets from "import machine"
+        module = types.ModuleType('machine')
+        module.unique_id = lambda: self.unique_id
+        module.reset = lambda: None
+        return module
+
+    def print(self, *args, sep=' ', end='\n', **kwargs):
+        # Replacement for print so output from each device can be shown or kept quiet
+        if self.verbose:
+            sys.stdout.write('[{:>9.0f} {}] '.format(self.scheduler.now, self.name) + sep.join(str(arg) for arg in args) + end)
+
+    def input(self, prompt=''):
+        raise RuntimeError('{} halted waiting for input: {}'.format(self.name, prompt))
+
+    def run(self):
+        # Thread target: waits for its first turn, then runs the program until it ends or the simulation stops
+        modules = {'microbit': self.microbit_module(), 'radio': self.radio.module(), 'machine': self.machine_module()}
+
+        def lcl_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if name in modules:
+                return modules[name]
+            return builtins.__import__(name, globals, locals, fromlist, level)
+
+        lcl_builtins = dict(builtins.__dict__)
+        lcl_builtins.update({'__import__': lcl_import, 'print': self.print, 'input': self.input})
+
+        with open(self.path) as file:
+            code = compile(file.read(), self.path, 'exec')
+
+        self.namespace.update({'__name__': '__main__', '__file__': self.path, '__builtins__': lcl_builtins})
+        try:
+            self.scheduler.wait_turn(self)
+            self.turn_start = time.perf_counter()
+            exec(code, self.namespace)
+        except SimulationEnd:
+            return
+        except Exception as e:
+            self.error = e
+        self.scheduler.finish(self)
+
+    def start(self):
+        self.thread.start()
+
+
+class SteeringModel:
+    # Connects the car's steering pins to the model in plant.py
+    # The position is brought up to date whenever a steering pin is written or the potentiometer is read
+
+    def __init__(self, device, position=steering_centre, left_pin='pin4', right_pin='pin3', sensor_pin='pin0'):
+        self.device = device
+        self.position = position
+        self.last_time = 0.0
+        self.left = device.pins[left_pin]
+        self.right = device.pins[right_pin]
+        self.trace = [] # List of (time, position, left, right) recorded each time the car writes the steering pins
+
+        self.left.write_hook = self.on_write
+        self.right.write_hook = self.on_write
+        device.pins[sensor_pin].read_source = self.read
+
+    def advance(self):
+        now = self.device.scheduler.now
+        if now > self.last_time:
+            self.position = plant_step(self.position, self.left.value, self.right.value, now - self.last_time)
+            self.last_time = now
+
+    def on_write(self, pin, value):
+        # The car writes the left pin then the right pin each loop, so the trace is recorded once both are known
+        self.advance()
+        if pin is self.right:
+            self.trace.append((self.last_time, self.position, self.left.value, value))
+
+    def read(self):
+        self.advance()
+        return round(self.position)
+
+
+class Simulation:
+    # Runs controller.py and car.py against each other with the steering model attached to the car
+    # Extra controller/car pairs can share the radio group to check that each car only follows its own controller
+
+    def __init__(self, steering=None, gain_readings=(512, 512, 512), forward=False, verbose=False, folder=None, pairs=1, pair_period=500):
+        # steering: function of simulated time (ms) returning the controller's accelerometer x value (steering request)
+        # gain_readings: potentiometer readings (0-1023) for Gp, Gi and Gd
+        # pairs: number of controller/car pairs. Each car's button A is pressed pair_period (ms) after the last to pair them one at a time
+        folder = folder if folder else os.path.dirname(os.path.abspath(__file__))
+        self.scheduler = Scheduler()
+        bus = []
+
+        self.controllers, self.cars, self.models = [], [], []
+        for index in range(pairs):
+            suffix = str(index + 1) if index else '' # The first pair is named controller and car
+            self.controllers.append(Device(self.scheduler, bus, 'controller' + suffix, os.path.join(folder, 'controller.py'), verbose))
+            self.cars.append(Device(self.scheduler, bus, 'car' + suffix, os.path.join(folder, 'car.py'), verbose))
+            self.models.append(SteeringModel(self.cars[-1]))
+            self.cars[-1].button_a.press(pair_period * (index + 1))
+            # Pairing confirmation (see the Pairing Procedure in car.py). The car pairs with whichever controller it last heard
+
+        self.controller, self.car, self.model = self.controllers[0], self.cars[0], self.models[0]
+        self.steering = steering if steering else square_wave()
+
+        for controller in self.controllers:
+            controller.accelerometer.sources['x'] = self.steering
+            for pin, reading in zip(['pin0', 'pin1', 'pin2'], gain_readings):
+                controller.pins[pin].value = reading
+            if forward:
+                controller.button_b.press(0, math.inf)
+
+    def run(self, duration):
+        # Runs for duration (ms) of simulated time and returns the real time taken (s)
+        start = time.perf_counter()
+        self.scheduler.run(duration)
+        for device in self.scheduler.devices:
+            if device.error:
+                raise RuntimeError('{} stopped: {!r}'.format(device.name, device.error)) from device.error
+        return time.perf_counter() - start
+
+    def target(self, now):
+        # Steering position the car should be aiming for at a given time, using the same conversion as the car
+        request = max(-1023, min(1023, int(self.steering(now))))
+        return max(steering_min, min(steering_max, mapping(request, -1023, 1023, steering_min, steering_max)))
+
+    def rms_error(self, model=None):
+        # Root mean square of the difference between target and actual steering position over the trace of a car (the first by default)
+        model = model if model else self.model
+        errors = [(self.target(now) - position) ** 2 for now, position, left, right in model.trace]
+        return math.sqrt(sum(errors) / len(errors)) if errors else 0.0
+
+    def pairings(self):
+        # Returns a list of (controller name, car name) for every controller that has paired, from the programs' variables
+        addresses = {car.namespace.get('car_address'): car.name for car in self.cars}
+        return [(controller.name, addresses.get(controller.namespace.get('car_address'))) for controller in self.controllers]
+
+# ========== Function Declaration
+def square_wave(amplitude=600, period=4000):
+    # Function returning a steering request that switches between +/- amplitude every half period (ms)
+    return lambda now: amplitude if (now % period) < period / 2 else -amplitude
+
+# ========== Main Program
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the Controller and Car programs against a simulated steering model.')
+    parser.add_argument('--duration', type=float, default=60, help='Simulated time to run for (s).')
+    parser.add_argument('--gains', type=int, nargs=3, default=[512, 512, 512], metavar=('GP', 'GI', 'GD'), help='Potentiometer readings (0-1023) for the Gp, Gi and Gd pins on the controller.')
+    parser.add_argument('--amplitude', type=int, default=600, help='Steering request of the square wave test input (milliG).')
+    parser.add_argument('--period', type=float, default=4, help='Period of the square wave test input (s).')
+    parser.add_argument('--forward', action='store_true', help='Hold the forward button for the whole run.')
+    parser.add_argument('--trace', help='CSV file to write the steering trace (time, target, position, left, right) to.')
+    parser.add_argument('--pairs', type=int, default=1, help='Number of controller/car pairs sharing the radio group.')
+    parser.add_argument('--verbose', action='store_true', help='Show the output printed by each program.')
+    args = parser.parse_args()
+
+    sim = Simulation(square_wave(args.amplitude, args.period * 1000), args.gains, args.forward, args.verbose, pairs=args.pairs)
+    wall_time = sim.run(args.duration * 1000)
+
+    print("Simulated {:.1f} s in {:.2f} s ({:.0f}x real time)".format(args.duration, wall_time, args.duration / wall_time))
+    for controller, car, model in zip(sim.controllers, sim.cars, sim.models):
+        print("{} -> {}: messages sent: {}, dropped by {}: {}, {} steering RMS error: {:.1f}".format(controller.name, dict(sim.pairings()).get(controller.name),
+              controller.radio.sent, car.name, car.radio.dropped, car.name, sim.rms_error(model)))
+
+    if args.trace:
+        with open(args.trace, 'w') as file:
+            file.write('time,target,position,left,right\n')
+            for now, position, left, right in sim.model.trace:
+                file.write('{:.0f},{:.1f},{:.1f},{},{}\n'.format(now, sim.target(now), position, left, right))
@@ -0,0 +1,92 @@
+# Description: Lightweight debug telemetry for the Controller and Car programs. Each loop iteration is stored in a ring buffer without any formatting, only every Nth record is printed, and the last N records can be dumped on demand. Printed lines are turned back into a table by telemetry_decoder.py on desktop Python.
+# Version: 20261017-2000
+
+# ========== Library Imports
+from array import array
+try:
+    import struct
+    import binascii
+except ImportError:
+    import ustruct as struct # MicroPython names for the struct and binascii modules
+    import ubinascii as binascii
+
+# ========== Telemetry Config
+level_off = 0 # Nothing is printed or recorded
+level_error = 1 # Only events logged as errors are printed. Records are still kept for dumping
+level_info = 2 # Every decimation'th record is printed as well
+level_debug = 3 # Every record is printed, as the programs did before
+
+# Printed line layouts. Lines start with '@' so they can be picked out of any other output
+# @H,name,field,field,...     Header, printed once and again before each dump so the decoder knows the fields
+# @T,name,seq,value,value,... Record as text
+# @B,name,base64              Record packed as '<H' sequence number then one '<f' per field, used when binary is set
+# @D,name,count               Start of a dump of the count records that follow
+# @E,name,level,message       Event
+
+# ========== Class Declaration
+class Telemetry:
+    # Records one row of values per loop iteration into a ring buffer of the last history rows
+    # record() only copies the values into a preallocated array, text is only built for the rows that are printed
+
+    def __init__(self, name, fields, level=level_info, decimation=50, history=32, binary=False, output=print):
+        # output: function each line is printed with. Programs pass their own print so the simulator can capture the lines
+        self.name = name
+        self.output = output
+        self.fields = fields
+        self.level = level
+        self.decimation = decimation # Every decimation'th record is printed at level_info
+        self.binary = binary
+        self.history = history
+        self.buffer = array('f', [0] * (history * len(fields)))
+        self.seq_buffer = array('H', [0] * history) # Sequence number of each stored row
+        self.seq = 0 # Sequence number of the next record, wraps around at 65536
+        self.head = 0 # Row of the ring buffer the next record is stored in
+        self.count = 0 # Rows stored, up to history
+        self.record_format = '<H' + 'f' * len(fields)
+        self.header()
+
+    def header(self):
+        if self.level > level_off:
+            self.output('@H,{},{}'.format(self.name, ','.join(self.fields)))
+
+    def record(self, *values):
+        # Stores a row of values, one per field, and prints it if due for the level and decimation
+        if self.level == level_off:
+            return
+        row = self.head
+        start = row * len(self.fields)
+        for index in range(len(values)):
+            self.buffer[start + index] = values[index]
+        self.seq_buffer[row] = self.seq
+        if self.count < self.history:
+            self.count += 1
+
+        if self.level >= level_debug or (self.level == level_info and self.seq % self.decimation == 0):
+            self.emit(row)
+        self.seq = (self.seq + 1) & 0xFFFF
+        self.head = (self.head + 1) % self.history
+
+    def emit(self, row):
+        # Prints a stored row
+        start = row * len(self.fields)
+        values = self.buffer[start:start + len(self.fields)]
+        if self.binary:
+            packed = struct.pack(self.record_format, self.seq_buffer[row], *values)
+            self.output('@B,{},{}'.format(self.name, binascii.b2a_base64(packed).decode().strip()))
+        else:
+            self.output('@T,{},{},{}'.format(self.name, self.seq_buffer[row], ','.join('{:g}'.format(value) for value in values)))
+
+    def dump(self):
+        # Prints every stored row, oldest first
+        if self.level == level_off:
+            return
+        self.header()
+        self.output('@D,{},{}'.format(self.name, self.count))
+        first = (self.head - self.count) % self.history
+        for offset in range(self.count):
+            self.emit((first + offset) % self.history)
+
+    def log(self, level, message):
+        # Prints an event message if the level allows it
+        if level <= self.level:
+            self.output('@E,{},{},{}'.format(self.name, level, message))
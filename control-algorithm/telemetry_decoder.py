@@ -0,0 +1,123 @@
+# Description: Desktop program that turns the telemetry lines printed by the Controller and Car programs (see telemetry.py) back into a table. Reads the Microbit's serial output, a saved log, or the simulator's --verbose output.
+# Version: 20261017-2000
+
+# ========== Library Imports
+import argparse
+import base64
+import struct
+import sys
+
+try:
+    import serial # pyserial, only needed when reading from a serial port
+except ImportError:
+    serial = None
+
+# ========== Class Declaration
+class Decoder:
+    # Keeps the fields of each telemetry source from its header lines so records can be decoded
+    # decode() returns (kind, name, values): kind is 'record', 'dump', 'event' or None for lines that are not telemetry
+
+    def __init__(self):
+        self.fields = {} # Dictionary of the field names of each source
+
+    def decode(self, line):
+        start = line.find('@')
+        if start < 0 or len(line) < start + 3:
+            return None, None, None
+        parts = line[start + 1:].strip().split(',')
+        kind, name = parts[0], parts[1] if len(parts) > 1 else ''
+
+        if kind == 'H':
+            self.fields[name] = parts[2:]
+            return None, name, None
+        if kind == 'D':
+            return 'dump', name, [int(parts[2])]
+        if kind == 'E':
+            return 'event', name, [int(parts[2]), ','.join(parts[3:])]
+        if name not in self.fields:
+            return None, name, None # Records seen before their header cannot be decoded
+
+        try:
+            if kind == 'T':
+                values = [int(parts[2])] + [float(value) for value in parts[3:]]
+            elif kind == 'B':
+                packed = base64.b64decode(parts[2])
+                values = list(struct.unpack('<H' + 'f' * len(self.fields[name]), packed))
+            else:
+                return None, name, None
+        except (ValueError, IndexError, struct.error):
+            return None, name, None # Line cut short or corrupted on the serial link
+
+        if len(values) != len(self.fields[name]) + 1:
+            return None, name, None
+        return 'record', name, values
+
+# ========== Function Declaration
+def open_source(source, baudrate):
+    # Function returning the lines of a serial port, a file or standard input ('-')
+    if source == '-':
+        return sys.stdin
+    if source.startswith('/dev/') or source.upper().startswith('COM'):
+        if serial is None:
+            raise SystemExit("pyserial is required to read from a serial port (pip install pyserial)")
+        port = serial.Serial(source, baudrate, timeout=None)
+        return (line.decode(errors='ignore') for line in iter(port.readline, b''))
+    return open(source, 'r')
+
+
+def format_value(value):
+    return '{:.6g}'.format(value) if isinstance(value, float) else str(value)
+
+# ========== Main Program
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Decode the telemetry printed by the Controller and Car programs into a table.')
+    parser.add_argument('source', nargs='?', default='-', help="Serial port of the Microbit (e.g. /dev/ttyACM0 or COM3), a file, or - for standard input.")
+    parser.add_argument('--baudrate', type=int, default=115200)
+    parser.add_argument('--name', help='Only show the telemetry of this program (e.g. car or controller).')
+    parser.add_argument('--dumps', action='store_true', help='Only show records from dumps, not the decimated records printed while running.')
+    parser.add_argument('--width', type=int, default=10, help='Width of each table column.')
+    parser.add_argument('--csv', help='Also write every record to this CSV file, one file per program named <csv>-<name>.csv')
+    args = parser.parse_args()
+
+    decoder = Decoder()
+    shown_header = None # Program whose column headings were printed last
+    remaining = {} # Dictionary of the records left in the current dump of each program
+    csv_files = {}
+    column = '{:>' + str(args.width) + '}'
+
+    try:
+        for line in open_source(args.source, args.baudrate):
+            kind, name, values = decoder.decode(line)
+            if kind is None or (args.name and name != args.name):
+                continue
+
+            if kind == 'dump':
+                remaining[name] = values[0]
+                print("-- Dump of the last {} {} records".format(values[0], name))
+                shown_header = None
+                continue
+            if kind == 'event':
+                print("-- {} event (level {}): {}".format(name, values[0], values[1]))
+                continue
+
+            in_dump = remaining.get(name, 0) > 0
+            if in_dump:
+                remaining[name] -= 1
+            elif args.dumps:
+                continue
+
+            if shown_header != name:
+                print(' '.join(column.format(heading[:args.width]) for heading in [name] + ['seq'] + decoder.fields[name]))
+                shown_header = name
+            print(' '.join(column.format(value) for value in [''] + [format_value(value) for value in values]))
+
+            if args.csv:
+                if name not in csv_files:
+                    csv_files[name] = open('{}-{}.csv'.format(args.csv, name), 'w')
+                    csv_files[name].write(','.join(['seq'] + decoder.fields[name]) + '\n')
+                csv_files[name].write(','.join(format_value(value) for value in values) + '\n')
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for file in csv_files.values():
+            file.close()
@@ -0,0 +1,159 @@
+# Description: Desktop tool for tuning the steering PID gains. Candidate gains from the controller's gain range are run through the PID and steering model and ranked on settling time, overshoot and actuator effort.
+# Version: 20261018-1530
+
+# ========== Library Imports
+import argparse
+import concurrent.futures
+import itertools
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from pid import PID, limit_func
+from plant import plant_step, steering_pins, steering_centre
+
+# ========== Tuning Config
+loop_period = 10 # Time between control loop iterations (ms), matches the Car program
+step_targets = [715, 335, 600, 450] # Steering positions requested in turn, starting from the centre
+step_duration = 2000 # Time each target is held for (ms)
+settle_band = 0.05 # Settled once the error stays within this fraction of the step size
+weight_dict = {'settling': 1.0, 'overshoot': 1.0, 'effort': 0.25}
+# Dictionary declaration for the weighting of each score. Settling time as a fraction of step_duration, overshoot as a fraction of the step size and effort as the average pin value over 1023
+
+# ========== Function Declaration
+def gains_from_unit(point):
+    # Function to convert a point in the unit cube to Gp, Gi, Gd
+    # Covers the same range and scale as the controller potentiometers: Gp 1-10 (linear), Gi 1e-6 to 1 and Gd 1 to 1e5 (log)
+    up, ui, ud = [limit_func(value, 0, 1) for value in point]
+    return 1 + (9 * up), 10 ** (-6 + (6 * ui)), 10 ** (5 * ud)
+
+
+def evaluate(gains):
+    # Function to run a set of gains through the steering steps and score them. Lower scores are better
+    # The steering adjustment and pin limits follow the Car program
+    Gp, Gi, Gd = gains
+    steering_pid = PID(Gp, Gi, Gd, derivative_filter=0.5)
+    position = steering_centre
+    settling, overshoot, effort = 0.0, 0.0, 0.0
+    previous = position
+
+    for target in step_targets:
+        step_size = max(abs(target - previous), 1)
+        direction = 1 if target > previous else -1
+        last_unsettled = 0
+        peak = 0.0
+
+        for now in range(0, step_duration, loop_period):
+            sensed = round(position) # Potentiometer readings are whole numbers
+            adjustment = steering_pid.update(target, sensed, loop_period)
+
+            left_value, right_value = steering_pins(adjustment, sensed)
+            position = plant_step(position, left_value, right_value, loop_period)
+
+            error = target - position
+            if abs(error) > settle_band * step_size:
+                last_unsettled = now + loop_period
+            peak = max(peak, -error * direction)
+            effort += (left_value + right_value) / 1023
+
+        settling += last_unsettled / step_duration
+        overshoot += peak / step_size
+        previous = target
+
+    steps = len(step_targets)
+    settling, overshoot, effort = settling / steps, overshoot / steps, effort / (steps * (step_duration // loop_period))
+    score = (weight_dict['settling'] * settling) + (weight_dict['overshoot'] * overshoot) + (weight_dict['effort'] * effort)
+    return score, settling, overshoot, effort
+
+
+def evaluate_point(point):
+    # Function used by the worker processes, returns the score details with the gains and point they came from
+    gains = gains_from_unit(point)
+    return evaluate(gains) + gains + (tuple(point),)
+
+
+def nelder_mead(start, iterations=100, size=0.1):
+    # Function to search for the lowest score from a starting point in the unit cube
+    # Simplex method with the standard reflection, expansion, contraction and shrink steps
+    score = lambda point: evaluate(gains_from_unit(point))[0]
+    simplex = [list(start)] + [[value + (size if index == axis else 0) for index, value in enumerate(start)] for axis in range(len(start))]
+    scores = [score(point) for point in simplex]
+
+    for iteration in range(iterations):
+        order = sorted(range(len(simplex)), key=lambda index: scores[index])
+        simplex, scores = [simplex[index] for index in order], [scores[index] for index in order]
+        centroid = [sum(values) / (len(simplex) - 1) for values in zip(*simplex[:-1])]
+        towards = lambda factor: [c + factor * (w - c) for c, w in zip(centroid, simplex[-1])]
+
+        reflected = towards(-1)
+        reflected_score = score(reflected)
+        if reflected_score < scores[0]:
+            expanded = towards(-2)
+            expanded_score = score(expanded)
+            simplex[-1], scores[-1] = (expanded, expanded_score) if expanded_score < reflected_score else (reflected, reflected_score)
+        elif reflected_score < scores[-2]:
+            simplex[-1], scores[-1] = reflected, reflected_score
+        else:
+            contracted = towards(0.5)
+            contracted_score = score(contracted)
+            if contracted_score < scores[-1]:
+                simplex[-1], scores[-1] = contracted, contracted_score
+            else:
+                simplex = [simplex[0]] + [[b + 0.5 * (value - b) for b, value in zip(simplex[0], point)] for point in simplex[1:]]
+                scores = [scores[0]] + [score(point) for point in simplex[1:]]
+
+    best = min(range(len(simplex)), key=lambda index: scores[index])
+    return evaluate_point([limit_func(value, 0, 1) for value in simplex[best]])
+
+
+def candidates(method, count, seed):
+    # Function to get the points (unit cube) to evaluate for the grid and random methods
+    # Grid uses the largest number of points per axis within count, with at least 2 per axis
+    if method == 'grid':
+        per_axis = max(2, int(count ** (1 / 3) + 1e-9)) # Floor of the cube root, the small offset stops e.g. 1000 ** (1 / 3) rounding down to 9
+        values = [index / (per_axis - 1) for index in range(per_axis)]
+        return list(itertools.product(values, repeat=3))
+
+    generator = random.Random(seed)
+    return [(generator.random(), generator.random(), generator.random()) for index in range(count)]
+
+# ========== Main Program
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Search the controller gain range for the steering gains with the best response.')
+    parser.add_argument('--method', choices=['grid', 'random', 'nelder-mead'], default='random', help='Search method. nelder-mead refines the best random candidates.')
+    parser.add_argument('--count', type=int, default=2000, help='Number of candidates for grid/random, or random candidates searched before refining with nelder-mead. Grid uses the largest cube of points within the count (at least 8).')
+    parser.add_argument('--starts', type=int, default=8, help='Number of best candidates refined with nelder-mead.')
+    parser.add_argument('--iterations', type=int, default=100, help='Nelder-mead iterations per start.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--jobs', type=int, default=None, help='Number of worker processes. Defaults to the number of CPUs.')
+    parser.add_argument('--top', type=int, default=10, help='Number of ranked results shown.')
+    parser.add_argument('--output', help='CSV file every result is written to.')
+    args = parser.parse_args()
+
+    method = 'random' if args.method == 'nelder-mead' else args.method
+    points = candidates(method, args.count, args.seed)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        results = list(executor.map(evaluate_point, points, chunksize=max(1, len(points) // 64)))
+
+        if args.method == 'nelder-mead':
+            # Refine the best candidates in parallel, one search per worker
+            starts = [result[-1] for result in sorted(results)[:args.starts]]
+            results += list(executor.map(nelder_mead, starts, [args.iterations] * len(starts)))
+
+    results.sort()
+
+    print("{:>4} {:>8} {:>9} {:>9} {:>7} {:>6} {:>10} {:>10}   {}".format('Rank', 'Score', 'Settling', 'Overshoot', 'Effort', 'Gp', 'Gi', 'Gd', 'Pot readings (Gp, Gi, Gd)'))
+    for rank, (score, settling, overshoot, effort, Gp, Gi, Gd, point) in enumerate(results[:args.top], 1):
+        readings = [round(limit_func(value, 0, 1) * 1023) for value in point]
+        print("{:>4} {:>8.4f} {:>9.3f} {:>9.3f} {:>7.3f} {:>6.2f} {:>10.3g} {:>10.3g}   {}".format(rank, score, settling, overshoot, effort, Gp, Gi, Gd, readings))
+
+    score, settling, overshoot, effort, Gp, Gi, Gd, point = results[0]
+    print("Best gains: Gp={:.2f}, Gi={:.3g}, Gd={:.3g}".format(Gp, Gi, Gd))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write('score,settling,overshoot,effort,Gp,Gi,Gd\n')
+            for result in results:
+                file.write(','.join('{:.6g}'.format(value) for value in result[:7]) + '\n')
@@ -1,11 +1,13 @@
 # Description: A program that acquires and stores the acceleration data onboard the Microbit.
 # Author: Sonny Rickwood
-# Version: 20230428-1325
+# Version: 20261017-1700
 
 
 # ========== Library Imports
 from microbit import *
+from array import array
 import radio, log, speech
+import samples
 
 # ========== Microbit Configuration
 accelerometer.set_range(8) # Range: 0-8, Default: 8
@@ -13,6 +15,12 @@ global_radio_group = 255 # Range: 0-255, Default: 255
 radio.config(group=global_radio_group, power=7)
 radio.on()
 
+# ========== Logging Configuration
+sample_rate = 50 # Samples per second, Range: 1-100
+sample_period = 1000 // sample_rate # Time between samples (ms)
+buffer_len = 32 # Number of samples held in memory before they are written to the log
+stream_mode = False # Also send each batch over the radio to a relay Microbit (relay.py) for live viewing
+
 # ========== Start/Safety Procedure
 message = radio.receive()
 
@@ -30,7 +38,10 @@ while message != "Confirm Launch":
 # ========== Start Confirmation
 # Code to confirm to the user that the accelerometer calibration procedure is about to start
 display.show(Image.NO.invert()) # Inverts the "No" image previously shown
-radio.off() # Radio turned off to save power
+if stream_mode:
+    radio.config(length=251) # Allows a full packet of samples to be sent in one message
+else:
+    radio.off() # Radio turned off to save power
 log.delete(True) # Clears Microbit memory ready for data acquisition
 set_volume(255)
 
@@ -66,10 +77,31 @@ while wait_len > 0:
         display.show(Image.ALL_CLOCKS[time])
     sleep(slp_len)
 
-# Dictionary to contain biasing data 
-avg_dict = {'x':cali_dict['x']/cali_dict['len'], 
-            'y':cali_dict['y']/cali_dict['len'], 
-            'z':cali_dict['z']/cali_dict['len']}
+# Dictionary to contain biasing data, rounded so the logged values stay whole numbers (milliG)
+avg_dict = {'x':round(cali_dict['x']/cali_dict['len']), 
+            'y':round(cali_dict['y']/cali_dict['len']), 
+            'z':round(cali_dict['z']/cali_dict['len'])}
+
+# ========== Buffer Declaration
+# Samples are stored in preallocated arrays and written to the log in batches
+# Running time is stored with each sample as the log's own timestamp would be the time of the batch write
+time_buffer = array('l', [0] * buffer_len) # Running time (ms)
+accel_buffer = array('h', [0] * (buffer_len * 3)) # Biased acceleration (milliG), x, y, z of each sample in turn
+buffer_count = 0 # Number of samples currently in the buffer
+
+log.set_labels('Time (milliseconds)', 'x', 'y', 'z', timestamp=None)
+
+def flush_buffer(count):
+    # Function to write the buffered samples to the log, and send them to the relay when streaming
+    if stream_mode:
+        for start in range(0, count, samples.max_samples):
+            radio.send_bytes(samples.encode(time_buffer, accel_buffer, start, min(samples.max_samples, count - start)))
+    
+    for index in range(count):
+        log.add({'Time (milliseconds)': time_buffer[index], 
+                 'x': accel_buffer[index * 3], 
+                 'y': accel_buffer[index * 3 + 1], 
+                 'z': accel_buffer[index * 3 + 2]})
 
 # ========== Start Logging Confirmation
 # Code to confirm to user that data logging is about to start
@@ -85,14 +117,32 @@ for x in range(0, 3):
 # Logging can be halted if button B is pressed
 # Confirmation of logging is displayed through Microbit screen
 display.show(Image.HAPPY)
+next_sample = running_time()
 while not(button_b.was_pressed()):
-    # Logs biased acceleration data every 200 ms until button B is pressed
-    # Delay is added to prevent memory overflow
-    data = {'x': str(accelerometer.get_x() - avg_dict['x']), 
-            'y': str(accelerometer.get_y() - avg_dict['y']), 
-            'z': str(accelerometer.get_z() - avg_dict['z'])}
-    log.add(data)
-    sleep(200)
+    # Stores biased acceleration data every sample_period until button B is pressed
+    # All three axis are read at once and stored as whole numbers, no strings are built while sampling
+    accel_x, accel_y, accel_z = accelerometer.get_values()
+    
+    time_buffer[buffer_count] = running_time()
+    accel_buffer[buffer_count * 3] = accel_x - avg_dict['x']
+    accel_buffer[buffer_count * 3 + 1] = accel_y - avg_dict['y']
+    accel_buffer[buffer_count * 3 + 2] = accel_z - avg_dict['z']
+    buffer_count += 1
+    
+    if buffer_count == buffer_len:
+        # Buffer is full so the batch is written to the log
+        flush_buffer(buffer_count)
+        buffer_count = 0
+    
+    # Waits until the next sample is due. If writing the batch made the sample late, sampling carries on from now
+    next_sample += sample_period
+    wait_time = next_sample - running_time()
+    if wait_time > 0:
+        sleep(wait_time)
+    else:
+        next_sample = running_time()
+
+flush_buffer(buffer_count) # Writes any samples left in the buffer
 
 # ========== Finished Confirmation
 # Displays image to confirm logging has been halted
@@ -0,0 +1,167 @@
+# Description: Desktop benchmarks for display.py and the radio sample packets. Synthetic logs from a thousand to ten million rows are run through each processing stage (parse, normalise, integrate, render) with the stage timing hooks in display.py, reporting the rows processed per second.
+# Version: 20261018-1430
+
+# ========== Library Imports
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import display
+import samples
+from cache import ResultCache
+
+# ========== Benchmark Config
+sample_rate = 50 # Rate of the synthetic logs (Hz), matches acquisition.py
+packet_count = 1000 # Number of synthetic radio packets encoded and decoded per timing run
+
+# ========== Function Declaration
+def synthetic_log(path, rows, seed, binary=False):
+    # Function to write a log of the given number of rows in the format exported by the Microbit
+    # Running time in seconds with some jitter in the sample period, and milliG values around the weighting thresholds
+    generator = np.random.default_rng(seed)
+    time = np.cumsum(np.round(generator.normal(1 / sample_rate, 0.002, rows).clip(0.001), 3)) + 10
+    raw = generator.normal(0, 60, (rows, 3))
+
+    csv_path = path if not binary else path + '.csv'
+    with open(csv_path, 'w') as file:
+        file.write('Time (seconds),x,y,z\n')
+        np.savetxt(file, np.column_stack((time, raw)), delimiter=',', fmt=['%.3f', '%.2f', '%.2f', '%.2f'])
+
+    if binary:
+        display.convert_to_binary(csv_path, path)
+        os.remove(csv_path)
+
+
+def time_stages(func, repeat):
+    # Function to run func repeat times with profiling enabled, returns the best duration (s) of each stage
+    best = {}
+    for run in range(repeat):
+        times = display.enable_profiling()
+        func()
+        for stage, durations in times.items():
+            best[stage] = min(best.get(stage, float('inf')), sum(durations))
+    display.stage_times = None
+    return best
+
+
+def log_benchmarks(path, rows, repeat, workdir, max_points):
+    # Function to time each way display.py processes a log. Returns a list of (name, stage, seconds)
+    results = []
+    image = os.path.join(workdir, 'benchmark.png')
+
+    def full():
+        result = display.process_file(path)
+        with display.timed('render'):
+            display.plot_results(result, image, max_points)
+
+    for stage, seconds in time_stages(full, repeat).items():
+        results.append(('process_file', stage, seconds))
+
+    def export():
+        result = display.process_file(path)
+        with display.timed('export'):
+            display.export_results(result, os.path.join(workdir, 'benchmark-results.npz'), 'npz')
+
+    results.append(('no-plot', 'export', time_stages(export, repeat)['export']))
+
+    def stream():
+        with contextlib.redirect_stdout(io.StringIO()): # Progress printed for each chunk is not wanted here
+            display.stream_file(path, os.path.join(workdir, 'benchmark-integrated.csv'))
+
+    for stage, seconds in time_stages(stream, repeat).items():
+        results.append(('stream_file', stage, seconds))
+
+    # The first cached run fills the cache, later runs load every stage from it
+    shutil.rmtree(os.path.join(workdir, 'cache'), ignore_errors=True)
+    cache = ResultCache(os.path.join(workdir, 'cache'))
+    for name, runs in [('cached (cold)', 1), ('cached (warm)', repeat)]:
+        for stage, seconds in time_stages(lambda: display.process_file_cached(path, cache), runs).items():
+            results.append((name, stage, seconds))
+
+    return results
+
+
+def packet_benchmarks(repeat, seed):
+    # Function to time encoding and decoding synthetic sample packets. Returns a list of (name, stage, seconds per sample)
+    generator = np.random.default_rng(seed)
+    count = packet_count * samples.max_samples
+    time_buffer = [int(value) for value in np.cumsum(generator.integers(18, 23, count))]
+    accel_buffer = [int(value) for value in generator.integers(-2048, 2048, count * 3)]
+    starts = range(0, count, samples.max_samples)
+    packets = [samples.encode(time_buffer, accel_buffer, start, samples.max_samples) for start in starts]
+
+    encode = min(timeit.repeat(lambda: [samples.encode(time_buffer, accel_buffer, start, samples.max_samples) for start in starts], number=1, repeat=repeat))
+    decode = min(timeit.repeat(lambda: [samples.decode(packet) for packet in packets], number=1, repeat=repeat))
+    return [('samples', 'encode', encode / count), ('samples', 'decode', decode / count)]
+
+
+def read_results(path):
+    # Function to read the results saved by a previous run, returns a dictionary of (rows, name, stage) to seconds
+    results = {}
+    with open(path) as file:
+        next(file, None)
+        for line in file:
+            rows, name, stage, seconds, rate = line.rstrip('\n').split(',')
+            results[(int(rows), name, stage)] = float(seconds)
+    return results
+
+# ========== Main Program
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark display.py on synthetic logs and the radio sample packets.')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1e3, 1e4, 1e5, 1e6], help='Numbers of rows in the synthetic logs, e.g. --sizes 1e3 1e7.')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing runs per benchmark, the best is kept.')
+    parser.add_argument('--binary', action='store_true', help='Write the synthetic logs in the binary format instead of CSV.')
+    parser.add_argument('--max-points', type=int, default=display.render_bins, help='Number of bins each trace is decimated to when rendering. 0 plots every sample.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workdir', help='Folder the synthetic logs are written to and kept in. Defaults to a temporary folder.')
+    parser.add_argument('--output', help='CSV file the results are written to, for comparing later runs with --baseline.')
+    parser.add_argument('--baseline', help='CSV file from an earlier run. Results slower by more than --tolerance are reported as regressions.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Fractional slow down allowed before a result counts as a regression.')
+    args = parser.parse_args()
+
+    display.use_backend('Agg')
+    results = [] # List of (rows, name, stage, seconds)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        workdir = args.workdir if args.workdir else temp_dir
+        os.makedirs(workdir, exist_ok=True)
+
+        # ========== Log Benchmarks
+        print("{:>9} {:<15} {:<10} {:>10} {:>12}".format('Rows', 'Function', 'Stage', 'Time [s]', 'Rows/s'))
+        for size in args.sizes:
+            rows = int(size)
+            path = os.path.join(workdir, 'synthetic-{}.{}'.format(rows, 'mbin' if args.binary else 'csv'))
+            if not os.path.exists(path):
+                synthetic_log(path, rows, args.seed, args.binary)
+
+            for name, stage, seconds in log_benchmarks(path, rows, args.repeat, workdir, args.max_points):
+                print("{:>9} {:<15} {:<10} {:>10.4f} {:>12.0f}".format(rows, name, stage, seconds, rows / seconds if seconds > 0 else 0))
+                results.append((rows, name, stage, seconds))
+
+        # ========== Packet Benchmarks
+        for name, stage, seconds in packet_benchmarks(args.repeat, args.seed):
+            print("{:>9} {:<15} {:<10} {:>10.2e} {:>12.0f}".format(1, name, stage, seconds, 1 / seconds))
+            results.append((1, name, stage, seconds))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write('rows,function,stage,seconds,rows_per_second\n')
+            for rows, name, stage, seconds in results:
+                file.write('{},{},{},{:.6g},{:.6g}\n'.format(rows, name, stage, seconds, rows / seconds if seconds > 0 else 0))
+
+    if args.baseline:
+        baseline = read_results(args.baseline)
+        regressions = [(key, baseline[key], seconds) for key, seconds in [((rows, name, stage), seconds) for rows, name, stage, seconds in results]
+                       if key in baseline and seconds > baseline[key] * (1 + args.tolerance)]
+        for (rows, name, stage), old, new in regressions:
+            print("Regression: {} rows {} {} {:.3g} s -> {:.3g} s ({:+.0%})".format(rows, name, stage, old, new, new / old - 1))
+        if regressions:
+            raise SystemExit(1)
+        print("No regressions against {}".format(args.baseline))
@@ -0,0 +1,122 @@
+# Description: On-disk cache of the intermediate results produced by display.py, so unchanged files and parameters are not processed again and appended logs only need their new rows processed.
+# Version: 20261018-1400
+
+# ========== Library Imports
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+
+# ========== Cache Config
+stage_limit = 4 # Parameter sets (e.g. weightings, integration method) kept for each stage of a file, the least recently used are removed
+
+# ========== Function Declaration
+def make_key(*parts):
+    # Function to combine a file hash and processing parameters into a single key
+    return hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+
+def fingerprint(path, prefix_size=None, block_size=1 << 20):
+    # Function to hash the contents of a file in one pass
+    # Returns the hash of the whole file, the hash of its first prefix_size bytes (None if prefix_size is not given or too large)
+    # and the (size, hash) of the contents up to the end of the last line, for a file whose final line is still being written
+    # The prefix hash is used to check that a file has only been appended to since it was cached
+    content = hashlib.blake2b(digest_size=16)
+    prefix = None
+    position = 0
+    line_state, line_block, line_start = content.copy(), b'', 0
+    # Hash state before the last block containing a newline, and that block. Only finished once the whole file is read
+
+    with open(path, 'rb') as file:
+        while True:
+            block = file.read(block_size)
+            if not block:
+                break
+            if prefix_size is not None and prefix is None and position + len(block) >= prefix_size:
+                lcl_hash = content.copy()
+                lcl_hash.update(block[:prefix_size - position])
+                prefix = lcl_hash.hexdigest()
+            if b'\n' in block:
+                line_state, line_block, line_start = content.copy(), block, position
+            content.update(block)
+            position += len(block)
+
+    if prefix_size == 0:
+        prefix = hashlib.blake2b(digest_size=16).hexdigest()
+    line_end = line_block.rfind(b'\n') + 1
+    line_state.update(line_block[:line_end])
+    return content.hexdigest(), prefix, (line_start + line_end, line_state.hexdigest())
+
+# ========== Class Declaration
+class ResultCache:
+    # Stores the arrays of each processing stage as .npz files named by stage and key
+    # An index entry per input file records which contents were last cached for it, allowing appended rows to be found
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def stage_path(self, stage, key):
+        return os.path.join(self.directory, '{}-{}.npz'.format(stage, key))
+
+    def load(self, stage, key):
+        # Returns a dictionary of the stored arrays, or None if the stage has not been cached for the key
+        try:
+            with np.load(self.stage_path(stage, key)) as data:
+                return {name: data[name] for name in data.files}
+        except (OSError, ValueError):
+            return None
+
+    def save(self, stage, key, **arrays):
+        # Written to a temporary file first so an interrupted write never leaves a partial entry
+        # Each write has its own temporary file as batch workers may save the same entry at once. If the entry cannot be
+        # moved into place it is left uncached, the caller already has the arrays
+        descriptor, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.npz')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                np.savez(file, **arrays)
+            os.replace(temp_path, self.stage_path(stage, key))
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def remove(self, stage, key):
+        try:
+            os.remove(self.stage_path(stage, key))
+        except OSError:
+            pass
+
+    def use(self, entry, stage, key, limit=stage_limit):
+        # Records key as the most recently used entry of stage in a file's index entry
+        # Entries of the stage beyond the limit are removed from the cache
+        keys = entry.setdefault('keys', {}).setdefault(stage, [])
+        if key in keys:
+            keys.remove(key)
+        keys.insert(0, key)
+        for old_key in keys[limit:]:
+            self.remove(stage, old_key)
+        del keys[limit:]
+
+    def evict(self, entry):
+        # Removes every stage entry recorded in a file's index entry, used once the file's contents have changed
+        for stage, keys in entry.get('keys', {}).items():
+            for key in keys:
+                self.remove(stage, key)
+
+    def index_path(self, path):
+        return os.path.join(self.directory, 'index-{}.json'.format(make_key(os.path.abspath(path))))
+
+    def get_index(self, path):
+        # Returns the index entry of a file: the hash, size and prefix hash of the contents last cached and the keys of its cached stages, or None
+        try:
+            with open(self.index_path(path)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def set_index(self, path, entry):
+        with open(self.index_path(path), 'w') as file:
+            json.dump(entry, file)
@@ -1,19 +1,105 @@
 # Description: A program that takes the file containing the acceleration data computes the delta time between data collections and converts acceleration to velocity and displacement counterparts. The data should then be plotted on an appropriate graph.
 # Author: Sonny Rickwood
-# Version: 20230307-1122
+# Version: 20261018-1500
 
 # ========== Library Imports
-from matplotlib import pyplot as plt
+import argparse
+import concurrent.futures
+import contextlib
+import glob
+import io
+import itertools
+import os
+from time import perf_counter
+import numpy as np
+
+from cache import ResultCache, fingerprint, make_key
 
 # ========== Global Variable Declaration
-running_time, dlt_time, norm_running_time = [], [0], [0] # List declaration to store running time, delta time  and normalised running time
+axis = ['x', 'y', 'z'] # Accelerometer axis in the order they are logged
+
+weighting_dict = {'x':20, 'y':10, 'z':50}
+# Dictionary declaration for the milliG value each axis must exceed before it is counted as acceleration
+
+binary_magic = b'MBACC\x00\x01\x00' # Header written at the start of binary log files, the last two bytes are the format version
+binary_dtype = np.dtype([('time', '<f8'), ('x', '<f4'), ('y', '<f4'), ('z', '<f4')])
+# Fixed width record stored for each sample in binary log files. Running time in seconds and the raw milliG values
+
+still_deviation = 10 # Largest standard deviation (milliG) of each axis while the Microbit is stationary, driving vibrates it more than this
+
+render_bins = 6 * 300 # Width of the saved figure in pixels (6 inches at 300 dpi), used as the number of bins traces are decimated to
+
+plt = None # matplotlib.pyplot, only imported the first time a plot is drawn (see get_pyplot())
+plot_backend = None # Matplotlib backend used for plots. None uses the default, 'Agg' renders to file without opening a window
+
+output_suffixes = ('-integrated', '-results') # Endings of the names of the results written for each log (see output_path())
 
-acceleration_dict = {'x':[0], 'y':[0], 'z':[0]}
-velocity_dict = {'x':[0], 'y':[0], 'z':[0]}
-distance_dict = {'x':[0], 'y':[0], 'z':[0]}
-# Dictionary declaration for storing lists of acceleration, velocity and distance values
+result_columns = ['time'] + ['{}_{}'.format(series, dim) for series in ['accel', 'velocity', 'distance'] for dim in axis]
+# Column names of the results written by stream_file() and export_results()
+
+log_levels = {'off': 0, 'error': 1, 'info': 2, 'debug': 3} # Same levels as control-algorithm/telemetry.py
+log_level = log_levels['info']
+# Progress is printed at info, values for every row only at debug as printing each row slows processing down a lot
+
+stage_times = None
+# Dictionary of the durations (s) recorded for each processing stage, e.g. {'parse': [0.12, ...]}. None unless profiling is enabled
 
 # ========== Function Declaration
+def get_pyplot():
+    # Global function for importing matplotlib.pyplot when it is first needed
+    # Importing it takes most of the start up time, so processing that never plots does not pay for it
+    global plt
+    if plt is None:
+        import matplotlib
+        if plot_backend:
+            matplotlib.use(plot_backend)
+        from matplotlib import pyplot
+        plt = pyplot
+    return plt
+
+
+def use_backend(backend):
+    # Global function for choosing the matplotlib backend, before or after pyplot has been imported
+    global plot_backend
+    plot_backend = backend
+    if plt is not None:
+        plt.switch_backend(backend)
+
+
+def enable_profiling():
+    # Global function for starting to record how long each processing stage takes (see timed())
+    # Returns the dictionary the durations are recorded in
+    global stage_times
+    stage_times = {}
+    return stage_times
+
+
+@contextlib.contextmanager
+def timed(stage):
+    # Global function for timing a processing stage, used as "with timed('parse'):"
+    # Does nothing unless profiling has been enabled, so the stages cost nothing extra normally
+    if stage_times is None:
+        yield
+        return
+    
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        stage_times.setdefault(stage, []).append(perf_counter() - start)
+
+
+def profile_report(times, rows=None):
+    # Global function for formatting the recorded stage durations as a table of calls, total and mean time per stage
+    # Throughput in rows per second is included when the total number of rows processed is given
+    lines = ["{:<12} {:>6} {:>10} {:>10} {:>12}".format('Stage', 'Calls', 'Total [s]', 'Mean [s]', 'Rows/s')]
+    for stage, durations in times.items():
+        total = sum(durations)
+        rate = "{:>12.0f}".format(rows / total) if rows and total > 0 else "{:>12}".format('-')
+        lines.append("{:<12} {:>6} {:>10.4f} {:>10.4f} {}".format(stage, len(durations), total, total / len(durations), rate))
+    return '\n'.join(lines)
+
+
 def calculations(acceleration, delta_time, previous_velocity, previous_distance):
     # Global function for converting acceleration data to velocity and displacement counterparts
     # acceleration, previous_velocity and previous_distance to be entered as list of x, y, z
@@ -51,40 +137,530 @@ def accel_norm(milliG, weighting):
     else:
         return 0
 
-# ========== Main Program 
-if __name__ == '__main__':
-    # ========== File Work
-    try:
-        # Attempt to open outlined file and go over the contents to obtain:
-            # Running time
-            # Acceleration data pre-converted to meters per second
-        with open('microbit.csv', 'r') as file:
-            # Opens file and assigns the contents to variable file
-            # This ensures the file will be closed if an error or forgetting to do so
-            for index, line in enumerate(file):
-                # Iterate ovet each line of the files contents
-                # Where their is a comma, split the data to individual entries of a list
-                # Remove '\n' is present
-                logged_data = line.strip('\n').split(',')
-                 
-                if index != 0:
-                    # First line of every file contains the headers of the logged data so this needs to be skipped over
-                    # If not on the first line, the contents of the line is appended to their repsetive dictionary/list
-                    # Assigns the current time to a global variable to be used for working out the delta time between values
-                    current_time = float(logged_data[0])
-                    running_time.append(current_time)
-                    
-                    acceleration_dict['x'].append(accel_norm(logged_data[1], 20))
-                    acceleration_dict['y'].append(accel_norm(logged_data[2], 10))
-                    acceleration_dict['z'].append(accel_norm(logged_data[3], 50))
-                                       
-                    if index > 1:
-                        # Skips over the second line as their is no delta time for the first data collection
-                        # Delta time is worked out by getting the current time and minusing the previously stored running time
-                        dlt_time.append(round(current_time - running_time[-2], 3))           
-    except Exception as e:
-        print(e)
+
+def cumulative_integral(time, values, method='trapezoid'):
+    # Global function for the running integral of values over time, starting from 0 at the first sample
+    # method: 'trapezoid' or 'simpson'. Simpson's rule is applied to each pair of intervals (allowing uneven delta times)
+    # with the odd samples in between completed by the trapezoidal rule
+    time = np.asarray(time, dtype=float)
+    values = np.asarray(values, dtype=float)
+    
+    dt = np.diff(time).reshape((-1,) + (1,) * (values.ndim - 1))
+    # Delta time between each sample, shaped so it is broadcast over every axis column
+    
+    steps = ((values[:-1] + values[1:]) / 2) * dt # Area of each interval with the trapezoidal rule
+    integral = np.zeros_like(values)
+    integral[1:] = np.cumsum(steps, axis=0)
+    
+    if method == 'simpson' and len(values) > 2:
+        h0, h1 = dt[0:-1:2], dt[1::2]
+        count = len(h1)
+        f0, f1, f2 = values[0:2 * count:2], values[1:2 * count:2], values[2:2 * count + 1:2]
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pairs = ((h0 + h1) / 6) * (((2 - (h1 / h0)) * f0) + ((((h0 + h1)**2) / (h0 * h1)) * f1) + ((2 - (h0 / h1)) * f2))
+        # Area of each pair of intervals with Simpson's rule for uneven spacing
+        
+        pairs = np.where((h0 > 0) & (h1 > 0), pairs, steps[0:2 * count:2] + steps[1:2 * count:2])
+        # Repeated timestamps (delta time of 0) fall back to the trapezoidal rule
+        
+        integral[2::2] = np.cumsum(pairs, axis=0)
+        integral[3::2] = integral[2:-1:2] + steps[2::2]
+    
+    return integral
+
+
+def stationary_mask(time, raw, window=0.5, weightings=weighting_dict, deviation=still_deviation):
+    # Global function for finding the samples where the Microbit is stationary, from the raw milliG values
+    # The weighted acceleration cannot be used as it is also 0 while cruising at a steady speed
+    # Stationary means that over at least window seconds, every axis has a standard deviation below deviation (no vibration from driving)
+    # and a mean inside its weighting (no sustained acceleration)
+    # time and raw must be the same length, one row of raw per sample
+    raw = np.asarray(raw, dtype=float).reshape(len(raw), -1)
+    limits = np.array([weightings[dim] for dim in axis][:raw.shape[1]])
+    
+    dt = np.median(np.diff(time)) if len(time) > 1 else 0
+    length = max(int(round(window / dt)), 1) if dt > 0 else 1
+    if len(raw) < length:
+        return np.zeros(len(raw), dtype=bool)
+    
+    # Mean and variance of the window ending at each sample, using cumulative sums so no loop is needed
+    sums = np.cumsum(np.vstack((np.zeros((1, raw.shape[1])), raw)), axis=0)
+    squares = np.cumsum(np.vstack((np.zeros((1, raw.shape[1])), raw**2)), axis=0)
+    mean = (sums[length:] - sums[:-length]) / length
+    variance = (squares[length:] - squares[:-length]) / length - mean**2
+    quiet = np.all((variance < deviation**2) & (np.abs(mean) < limits), axis=1)
+    
+    # Mark every sample inside each quiet window as stationary, not just the samples the windows end on
+    mask = np.zeros(len(raw) + 1, dtype=int)
+    end_index = np.nonzero(quiet)[0] + length - 1
+    np.add.at(mask, end_index - length + 1, 1)
+    np.add.at(mask, end_index + 1, -1)
+    return np.cumsum(mask[:-1]) > 0
+
+
+def correct_drift(time, velocity, correction, window=0.5, raw=None):
+    # Global function for removing the drift that builds up in velocity from sensor bias
+    # 'detrend': the run is assumed to start and end at rest, so a linear trend taking the final velocity to 0 is removed
+    # 'zupt': zero velocity update. Velocity is set to 0 wherever the Microbit is stationary (see stationary_mask())
+    #         and the drift between stationary periods is removed linearly over time. Needs the raw milliG values of each sample
+    time = np.asarray(time, dtype=float)
+    shape = (-1,) + (1,) * (velocity.ndim - 1)
+    
+    if correction == 'detrend':
+        span = time[-1] - time[0]
+        if span <= 0:
+            return velocity
+        return velocity - ((velocity[-1] - velocity[0]) * ((time - time[0]) / span).reshape(shape))
+    
+    if correction == 'zupt':
+        if raw is None:
+            raise ValueError("Zero velocity updates need the raw milliG values")
+        raw = np.asarray(raw, dtype=float)
+        if len(raw) == len(time) - 1:
+            raw = np.concatenate((raw[:1], raw))
+            # Raw values from parse_log() have no row for the leading 0 sample, the first reading is used for it
+        mask = stationary_mask(time, raw, window)
+        if not np.any(mask):
+            return velocity
+        
+        flat = velocity.reshape(len(velocity), -1)
+        drift = np.column_stack([np.interp(time, time[mask], flat[mask, column]) for column in range(flat.shape[1])])
+        return velocity - drift.reshape(velocity.shape)
+    
+    raise ValueError("Unknown drift correction: {}".format(correction))
+
+
+def integrate(time, accel, decimals=3, method='euler', correction=None, window=0.5, raw=None):
+    # Global function for converting whole arrays of acceleration data to velocity and displacement counterparts
+    # Integration is vectorised over the whole time series, using cumulative sums instead of a Python loop
+    # time: running time of each sample, first sample is the starting point with a velocity and displacement of 0
+    # accel: acceleration per sample, either a single axis or one column per axis (e.g. x, y, z)
+    # decimals: rounding applied once to the returned values rather than at every step. None disables rounding
+    # method: 'euler' matches calculations() (constant acceleration over each delta time, so the first sample's acceleration is not used),
+    #         'trapezoid' or 'simpson' (see cumulative_integral())
+    # correction: None, 'detrend' or 'zupt' drift correction applied to velocity before displacement (see correct_drift())
+    # raw: raw milliG values of each sample, only needed by 'zupt' to find when the Microbit is stationary
+    
+    time = np.asarray(time, dtype=float)
+    accel = np.asarray(accel, dtype=float)
+    
+    dt = np.diff(time).reshape((-1,) + (1,) * (accel.ndim - 1))
+    # Delta time between each sample, shaped so it is broadcast over every axis column
+    
+    if method == 'euler':
+        velocity = np.zeros_like(accel)
+        velocity[1:] = np.cumsum(accel[1:] * dt, axis=0)
+        # v[i] = a[i] * t + v[i-1]
+    elif method in ('trapezoid', 'simpson'):
+        velocity = cumulative_integral(time, accel, method)
+    else:
+        raise ValueError("Unknown integration method: {}".format(method))
+    
+    if correction:
+        velocity = correct_drift(time, velocity, correction, window, raw)
+    
+    if method == 'euler':
+        displacement = np.zeros_like(accel)
+        displacement[1:] = np.cumsum(((accel[1:] * (dt**2)) / 2) + (velocity[:-1] * dt), axis=0)
+        # d[i] = (a[i] * t^2)/2 + v[i-1] * t + d[i-1]
+    else:
+        displacement = cumulative_integral(time, velocity, method)
+    
+    if decimals is not None:
+        velocity = np.round(velocity, decimals)
+        displacement = np.round(displacement, decimals)
+    
+    return velocity, displacement
+
+
+def accel_norm_array(milliG, weighting):
+    # Global function for converting an array of milliG values to meters per second
+    # Vectorised equivalent of accel_norm(), values inside +/- weighting are set to 0
+    milliG = np.asarray(milliG, dtype=float)
+    
+    return np.where(np.abs(milliG) > weighting, (milliG/1024) * 9.80665, 0.0)
+
+
+def time_scale(header):
+    # Global function for getting the factor converting the logged running time to seconds from the header line
+    # The Microbit log timestamp is in seconds, acquisition.py logs its own timestamp in milliseconds
+    return 0.001 if 'millisecond' in header.split(',')[0].lower() else 1.0
+
+
+def read_chunks(path, chunk_size=65536):
+    # Global generator for reading a logged data file a fixed number of rows at a time
+    # Each chunk is yielded as an array of running time, x, y and z so the whole file never has to be held in memory
+    # Running time is converted to seconds if the file was logged in milliseconds (see time_scale())
+    # Binary logs are read as slices of the memory mapped records, their running time is already in seconds
+    if is_binary_log(path):
+        records = load_binary(path)
+        for start in range(0, len(records), chunk_size):
+            records_slice = records[start:start + chunk_size]
+            yield np.column_stack([records_slice['time']] + [records_slice[dim] for dim in axis]).astype(float)
+        return
+    
+    with open(path, 'r') as file:
+        scale = time_scale(next(file, '')) # First line of every file contains the headers of the logged data so this needs to be skipped over
+        
+        while True:
+            lines = [line for line in itertools.islice(file, chunk_size) if line.strip()]
+            if not lines:
+                break
+            chunk = np.loadtxt(lines, delimiter=',', usecols=(0, 1, 2, 3), ndmin=2)
+            chunk[:, 0] *= scale
+            yield chunk
+
+
+class StreamIntegrator:
+    # Class for integrating acceleration data one chunk at a time
+    # The last running time, velocity and displacement are carried over so each chunk continues from the previous one
+    # The delta time of the very first sample is unknown. As the average of the whole file is not known until the end,
+    # the gap to the following sample is used instead
+    # Only the 'euler' and 'trapezoid' methods can be streamed, Simpson's rule and drift correction need the whole series
+    
+    def __init__(self, method='euler'):
+        if method not in ('euler', 'trapezoid'):
+            raise ValueError("Integration method cannot be streamed: {}".format(method))
+        
+        self.method = method
+        self.start_time = None
+        self.prev_time = 0.0
+        self.prev_accel = 0.0
+        self.prev_velocity = 0.0
+        self.prev_displacement = 0.0
+    
+    def update(self, time, accel):
+        # Returns the normalised running time, velocity and displacement for the chunk
+        time = np.asarray(time, dtype=float)
+        accel = np.asarray(accel, dtype=float)
+        
+        if self.start_time is None:
+            first_dt = time[1] - time[0] if len(time) > 1 else 0.0
+            self.start_time = time[0] - first_dt
+        
+        norm_time = time - self.start_time
+        
+        # Prepend the last sample of the previous chunk so the first delta time of this chunk is known
+        lcl_time = np.concatenate(([self.prev_time], norm_time))
+        lcl_accel = np.concatenate((np.zeros((1,) + accel.shape[1:]) + self.prev_accel, accel))
+        velocity, displacement = integrate(lcl_time, lcl_accel, decimals=None, method=self.method)
+        
+        displacement = displacement[1:] + self.prev_displacement + (self.prev_velocity * (norm_time - self.prev_time).reshape((-1,) + (1,) * (accel.ndim - 1)))
+        velocity = velocity[1:] + self.prev_velocity
+        
+        self.prev_time = norm_time[-1]
+        self.prev_accel = accel[-1]
+        self.prev_velocity = velocity[-1]
+        self.prev_displacement = displacement[-1]
+        
+        return norm_time, velocity, displacement
+
+
+def convert_to_binary(path, output, chunk_size=65536):
+    # Global function for converting a logged data file to the fixed width binary format
+    # Only needs to be done once per log, afterwards the file can be loaded with load_binary() without any text parsing
+    rows = 0
+    
+    with open(output, 'wb') as out_file:
+        out_file.write(binary_magic)
+        
+        for chunk in read_chunks(path, chunk_size):
+            records = np.empty(len(chunk), dtype=binary_dtype)
+            for index, name in enumerate(binary_dtype.names):
+                records[name] = chunk[:, index]
+            
+            records.tofile(out_file)
+            rows += len(chunk)
+    
+    return rows
+
+
+def is_binary_log(path):
+    # Global function for checking whether a logged data file is in the binary format, from its header
+    with open(path, 'rb') as file:
+        return file.read(len(binary_magic)) == binary_magic
+
+
+def load_binary(path):
+    # Global function for loading a binary log file
+    # The records are memory mapped so only the parts of the file which are used are read from disk
+    with open(path, 'rb') as file:
+        if file.read(len(binary_magic)) != binary_magic:
+            raise ValueError("{} is not a binary log file".format(path))
+    
+    return np.memmap(path, dtype=binary_dtype, mode='r', offset=len(binary_magic))
+
+
+def normalise_time(time):
+    # Global function for converting an array of running times to delta times and normalised running times
+    # Matches the list based calculations in the main program, including the leading 0 entries
+    # The first delta time is unknown so the average of all the delta times is used
+    dlt_time = np.round(np.diff(time), 3)
+    first_dt = round(float(np.mean(dlt_time)), 3) if len(dlt_time) else 0.0
+    dlt_time = np.concatenate(([0.0, first_dt], dlt_time))
+    
+    norm_running_time = np.round(np.cumsum(dlt_time), 3)
+    
+    return dlt_time, norm_running_time
+
+
+def stream_file(path, output, chunk_size=65536, method='euler'):
+    # Global function for processing a logged data file a chunk at a time
+    # Each chunk is thresholded, integrated and written out before the next chunk is read
+    # Progress is printed per chunk so results can be watched while the file is still being read
+    integrator = StreamIntegrator(method)
+    rows = 0
+    peak_accel = np.zeros(len(axis))
+    
+    with open(output, 'w') as out_file:
+        out_file.write(','.join(result_columns) + '\n')
+        
+        chunks = read_chunks(path, chunk_size)
+        while True:
+            with timed('parse'):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            
+            with timed('normalise'):
+                accel_arr = np.column_stack([accel_norm_array(chunk[:, index + 1], weighting_dict[dim]) for index, dim in enumerate(axis)])
+            with timed('integrate'):
+                time_arr, vel_arr, dis_arr = integrator.update(chunk[:, 0], accel_arr)
+            
+            with timed('write'):
+                np.savetxt(out_file, np.column_stack((time_arr, accel_arr, vel_arr, dis_arr)), delimiter=',', fmt='%.3f')
+            rows += len(chunk)
+            peak_accel = np.maximum(peak_accel, np.max(np.abs(accel_arr), axis=0))
+            
+            if log_level >= log_levels['info']:
+                print("Rows: {}, Time: {:.3f}, Velocity: {}, Distance: {}".format(rows, time_arr[-1], np.round(vel_arr[-1], 3), np.round(dis_arr[-1], 3)))
+    
+    # Summary statistics matching summarise(), built up without keeping the whole series
+    summary = {'rows': rows}
+    for index, dim in enumerate(axis):
+        summary['peak_accel_' + dim] = round(float(peak_accel[index]), 3)
+    for index, dim in enumerate(axis):
+        summary['final_velocity_' + dim] = round(float(integrator.prev_velocity[index]), 3) if rows else 0.0
+    for index, dim in enumerate(axis):
+        summary['final_distance_' + dim] = round(float(integrator.prev_displacement[index]), 3) if rows else 0.0
+    
+    return summary
+
+def parse_log(path, chunk_size=65536):
+    # Global function for reading a logged data file in either the CSV or binary format
+    # Returns the running time and the raw milliG values with one column per axis
+    if is_binary_log(path):
+        records = load_binary(path)
+        return records['time'], np.column_stack([records[dim] for dim in axis])
+    
+    chunks = list(read_chunks(path, chunk_size))
+    if not chunks:
+        raise ValueError("{} contains no logged data".format(path))
+    
+    data = np.concatenate(chunks)
+    return data[:, 0], data[:, 1:4]
+
+
+def normalise_accel(raw, weightings=weighting_dict):
+    # Global function for converting raw milliG values to meters per second using the weighting of each axis
+    # A leading row of 0 is added to match the leading 0 of the normalised running time
+    accel = np.zeros((len(raw) + 1, len(axis)))
+    
+    for index, dim in enumerate(axis):
+        accel[1:, index] = accel_norm_array(raw[:, index], weightings[dim])
+    
+    return accel
+
+
+def process_file(path, weightings=weighting_dict, chunk_size=65536, method='euler', correction=None):
+    # Global function for running every stage on a logged data file: parsing, acceleration normalisation, delta time and integration
+    # method and correction select the integration scheme and drift correction (see integrate())
+    # Returns a dictionary of the normalised running time and the acceleration, velocity and distance arrays (one column per axis)
+    with timed('parse'):
+        time, raw = parse_log(path, chunk_size)
+    
+    with timed('normalise'):
+        accel = normalise_accel(raw, weightings)
+    with timed('integrate'):
+        dlt_time, norm_running_time = normalise_time(time)
+        velocity, distance = integrate(norm_running_time, accel, method=method, correction=correction, raw=raw)
+    
+    return {'time': norm_running_time, 'acceleration': accel, 'velocity': velocity, 'distance': distance}
+
+
+def parse_rows(path, offset=0, scale=1.0):
+    # Global function for parsing a CSV log from a byte offset, used to parse only the rows appended since the file was cached
+    # Returns the running time and raw milliG values of every complete line, the offset after the last complete line
+    # and the running time scale. A final line without a newline is left out as it may still be being written
+    with open(path, 'rb') as file:
+        if offset == 0:
+            scale = time_scale(file.readline().decode(errors='ignore')) # Header line gives the units of the running time
+            offset = file.tell()
+        file.seek(offset)
+        data = file.read()
+    
+    end = data.rfind(b'\n') + 1
+    lines = [line for line in io.StringIO(data[:end].decode(errors='ignore')) if line.strip()]
+    
+    if lines:
+        rows = np.loadtxt(lines, delimiter=',', usecols=(0, 1, 2, 3), ndmin=2)
+        rows[:, 0] *= scale
+    else:
+        rows = np.empty((0, 4))
+    
+    return rows[:, 0], rows[:, 1:4], offset + end, scale
+
+
+def process_file_cached(path, cache, weightings=weighting_dict, method='euler', correction=None):
+    # Global function for process_file() with the parsed, normalised and integrated stages stored in a ResultCache
+    # Each stage is keyed on the file's hash plus the parameters it depends on, so changing e.g. the weightings
+    # only reruns normalisation and integration. If the file has been appended to since it was last cached, only the new
+    # rows are parsed and normalised. Integration is always over the whole series as the first delta time depends on every row
+    # The index entry of the file lists the normalise and integrate entries cached for it. They are removed once the file changes,
+    # and only the most recently used parameter sets are kept (see ResultCache.use())
+    # ========== Parse Stage
+    with timed('parse'):
+        entry = cache.get_index(path)
+        content_hash, prefix_hash, line_end = fingerprint(path, entry['size'] if entry else None)
+        appended = entry is not None and prefix_hash == entry['prefix'] and content_hash != entry['hash']
+        # True when the previously cached contents are unchanged at the start of the file
+        
+        parsed = cache.load('parse', content_hash)
+        if parsed is None:
+            is_binary = is_binary_log(path)
+            previous = cache.load('parse', entry['hash']) if appended else None
+            
+            if is_binary:
+                # Binary logs are memory mapped so are not worth caching
+                time, raw = parse_log(path)
+                parsed = {'time': np.asarray(time), 'raw': np.asarray(raw)}
+            elif previous is not None:
+                time, raw, size, scale = parse_rows(path, int(previous['size']), float(previous['scale']))
+                parsed = {'time': np.concatenate((previous['time'], time)), 'raw': np.concatenate((previous['raw'], raw)), 'size': size, 'scale': scale}
+            else:
+                time, raw, size, scale = parse_rows(path)
+                parsed = {'time': time, 'raw': raw, 'size': size, 'scale': scale}
+            
+            if not is_binary:
+                cache.save('parse', content_hash, **parsed)
+        
+        if entry is None or entry['hash'] != content_hash:
+            size = int(parsed['size']) if 'size' in parsed else os.path.getsize(path)
+            if size == os.path.getsize(path):
+                prefix = content_hash
+            elif size == line_end[0]:
+                prefix = line_end[1] # Final line still being written, the hash up to the last line is already known
+            else:
+                prefix = fingerprint(path, size)[1]
+            new_entry = {'hash': content_hash, 'size': size, 'prefix': prefix, 'keys': {}}
+        else:
+            new_entry = entry
+        
+        time, raw = parsed['time'], parsed['raw']
+        complete = len(time) # Number of rows from complete lines
+        
+        if 'size' in parsed and os.path.getsize(path) > int(parsed['size']):
+            # The file does not end with a newline. The final line is used if it is complete enough to parse
+            # but is not part of the parse stage, and is not reused when normalising rows appended later
+            with open(path, 'rb') as file:
+                file.seek(int(parsed['size']))
+                fields = file.read().decode(errors='ignore').strip().split(',')
+            try:
+                row = [float(field) for field in fields[:4]]
+            except ValueError:
+                row = []
+            if len(row) == 4:
+                time = np.append(time, row[0] * float(parsed['scale']))
+                raw = np.concatenate((raw, [row[1:]]))
+        
+        if len(time) == 0:
+            raise ValueError("{} contains no logged data".format(path))
+    
+    # ========== Normalise Stage
+    with timed('normalise'):
+        weight_vctr = [weightings[dim] for dim in axis]
+        normalise_key = make_key(content_hash, weight_vctr)
+        normalised = cache.load('normalise', normalise_key)
+        if normalised is None:
+            previous = cache.load('normalise', make_key(entry['hash'], weight_vctr)) if appended else None
+            
+            if previous is not None and int(previous['complete']) <= len(raw):
+                # Rows already normalised are kept, only the appended rows are converted
+                reused = int(previous['complete'])
+                new = normalise_accel(raw[reused:], weightings)[1:]
+                normalised = {'accel': np.concatenate((previous['accel'][:reused + 1], new)), 'complete': complete}
+            else:
+                normalised = {'accel': normalise_accel(raw, weightings), 'complete': complete}
+            cache.save('normalise', normalise_key, **normalised)
+        cache.use(new_entry, 'normalise', normalise_key)
+        
+        accel = normalised['accel']
     
+    # ========== Integrate Stage
+    with timed('integrate'):
+        integrate_key = make_key(content_hash, weight_vctr, method, correction, still_deviation)
+        integrated = cache.load('integrate', integrate_key)
+        if integrated is None:
+            dlt_time, norm_running_time = normalise_time(time)
+            velocity, distance = integrate(norm_running_time, accel, method=method, correction=correction, raw=raw)
+            integrated = {'time': norm_running_time, 'velocity': velocity, 'distance': distance}
+            cache.save('integrate', integrate_key, **integrated)
+        cache.use(new_entry, 'integrate', integrate_key)
+    
+    if new_entry is not entry:
+        if entry:
+            # Every stage cached for the previous contents has been superseded, the new entries replace them
+            cache.remove('parse', entry['hash'])
+            cache.evict(entry)
+    cache.set_index(path, new_entry)
+    
+    return {'time': integrated['time'], 'acceleration': accel, 'velocity': integrated['velocity'], 'distance': integrated['distance']}
+
+
+def process_file_legacy(path, weightings=weighting_dict):
+    # Global function for processing a logged data file one sample at a time with calculations()
+    # Kept so the outputs of process_file() can be checked against the original implementation
+    # Only reads CSV logs, as the original did
+    if is_binary_log(path):
+        raise ValueError("{} is a binary log file, --legacy only reads CSV logs".format(path))
+    
+    running_time, dlt_time, norm_running_time = [], [0], [0] # List declaration to store running time, delta time  and normalised running time
+
+    acceleration_dict = {'x':[0], 'y':[0], 'z':[0]}
+    velocity_dict = {'x':[0], 'y':[0], 'z':[0]}
+    distance_dict = {'x':[0], 'y':[0], 'z':[0]}
+    # Dictionary declaration for storing lists of acceleration, velocity and distance values
+    
+    # ========== File Work
+    with open(path, 'r') as file:
+        # Opens file and assigns the contents to variable file
+        # This ensures the file will be closed if an error or forgetting to do so
+        for index, line in enumerate(file):
+            # Iterate ovet each line of the files contents
+            # Where their is a comma, split the data to individual entries of a list
+            # Remove '\n' is present
+            logged_data = line.strip('\n').split(',')
+         
+            if index == 0:
+                # First line of every file contains the headers of the logged data so this needs to be skipped over
+                # The header gives the units of the running time
+                scale = time_scale(line)
+            else:
+                # If not on the first line, the contents of the line is appended to their repsetive dictionary/list
+                # Assigns the current time to a variable to be used for working out the delta time between values
+                current_time = float(logged_data[0]) * scale
+                running_time.append(current_time)
+            
+                acceleration_dict['x'].append(accel_norm(logged_data[1], weightings['x']))
+                acceleration_dict['y'].append(accel_norm(logged_data[2], weightings['y']))
+                acceleration_dict['z'].append(accel_norm(logged_data[3], weightings['z']))
+                               
+                if index > 1:
+                    # Skips over the second line as their is no delta time for the first data collection
+                    # Delta time is worked out by getting the current time and minusing the previously stored running time
+                    dlt_time.append(round(current_time - running_time[-2], 3))
+
     # ========== Delta Time Calculations
     dlt_time[0] = round(sum(dlt_time[1:]) / len(dlt_time[1:]), 3)
     # The delta time list must match the length of the acceleration data.
@@ -96,9 +672,9 @@ if __name__ == '__main__':
         # Delta time is iterated over with the sum being coverted at each step.
         # The sum is then appended to a list for each iterationg to calculate the normalised running time.
         norm_running_time.append(round(norm_running_time[index] + time, 3))
-    
+
     dlt_time.insert(0, 0) # Inserts additional value to ensure same length list as acceleration data
-    
+
     # ========== Velocity & Distance Calculations
     for index, time in enumerate(norm_running_time):
         if index != 0:
@@ -107,20 +683,75 @@ if __name__ == '__main__':
             accel_vctr = [acceleration_dict['x'][index], acceleration_dict['y'][index], acceleration_dict['z'][index]]
             prev_vel_vctr = [velocity_dict['x'][index - 1], velocity_dict['y'][index - 1], velocity_dict['z'][index - 1]]
             prev_dis_vctr = [distance_dict['x'][index - 1], distance_dict['y'][index - 1], distance_dict['z'][index - 1]]
-            
+        
             vel_vctr, dis_vctr = calculations(accel_vctr, dlt_time[index], prev_vel_vctr, prev_dis_vctr)
-            
-            print(dlt_time[index], accel_vctr[0], vel_vctr[0], dis_vctr[0]) # Prints values for debugging
-            
+        
+            if log_level >= log_levels['debug']:
+                print(dlt_time[index], accel_vctr[0], vel_vctr[0], dis_vctr[0]) # Prints values for debugging
+        
             velocity_dict['x'].append(vel_vctr[0])
             velocity_dict['y'].append(vel_vctr[1])
             velocity_dict['z'].append(vel_vctr[2])
-            
+        
             distance_dict['x'].append(dis_vctr[0])
             distance_dict['y'].append(dis_vctr[1])
             distance_dict['z'].append(dis_vctr[2])
     
-    # ========== Plotting Data
+    return {'time': np.array(norm_running_time), 
+            'acceleration': np.column_stack([acceleration_dict[dim] for dim in axis]), 
+            'velocity': np.column_stack([velocity_dict[dim] for dim in axis]), 
+            'distance': np.column_stack([distance_dict[dim] for dim in axis])}
+
+
+def summarise(result):
+    # Global function for reducing a processed run to its summary statistics
+    # Peak acceleration is the largest magnitude on each axis, velocity and distance are the final values
+    summary = {'rows': len(result['time']) - 1}
+    
+    for index, dim in enumerate(axis):
+        summary['peak_accel_' + dim] = round(float(np.max(np.abs(result['acceleration'][:, index]))), 3)
+    for index, dim in enumerate(axis):
+        summary['final_velocity_' + dim] = round(float(result['velocity'][-1, index]), 3)
+    for index, dim in enumerate(axis):
+        summary['final_distance_' + dim] = round(float(result['distance'][-1, index]), 3)
+    
+    return summary
+
+
+def decimate_minmax(x, y, bins):
+    # Global function for reducing a trace to at most two points per bin
+    # The smallest and largest value in each bin are kept (in time order) so peaks are not lost when plotting
+    # With one bin per horizontal pixel the plotted line looks the same as the full resolution trace
+    x = np.asarray(x)
+    y = np.asarray(y)
+    size = len(y) // bins
+    
+    if size < 3:
+        return x, y
+    
+    body = y[:size * bins].reshape(bins, size)
+    start = np.arange(bins) * size
+    index = [start + body.argmin(axis=1), start + body.argmax(axis=1), [0, len(y) - 1]]
+    
+    if size * bins < len(y):
+        # Samples left over after the last full bin are treated as one more bin
+        tail = y[size * bins:]
+        index.append([size * bins + tail.argmin(), size * bins + tail.argmax()])
+    
+    index = np.unique(np.concatenate(index))
+    return x[index], y[index]
+
+
+def plot_results(result, output=None, max_points=None):
+    # Global function for plotting the acceleration, velocity and distance of a processed run
+    # The figure is shown in a window unless an output file is given, in which case it is saved there instead
+    # max_points: number of bins each trace is decimated to with decimate_minmax(). None plots every sample
+    plt = get_pyplot()
+    time = result['time']
+    
+    trace = lambda values: decimate_minmax(time, values, max_points) if max_points else (time, values)
+    # Lambda declaration for getting the time and values to plot for a single trace
+    
     fig, plots = plt.subplots(3, 1, figsize=(6, 6))
     # Create a figure that two variables can reference. Fig for the overall figure, plots for a list of each subplot.
 
@@ -131,16 +762,15 @@ if __name__ == '__main__':
     font_axis = {'family':'serif', 'color':'black', 'size':10}
     # Create a dictionary for font references to easily change values
 
-    axis = ['x', 'y', 'z']
     titles = ['Acceleration','Velocity','Distance']
     ylabels = ['Acceleration [ms^-2]','Velocity [ms^-1]','Distance [m]']
     # Declaring lists so when the plots are being iterated over the accelerometer values, titles and ylabels can be easily referenced 
     
     for index, dim in enumerate(axis):
         # Iterating over the accelerometer axis and plotting the axis being iterated over on their respective subplot
-        plots[0].step(norm_running_time, acceleration_dict[dim], label=dim)
-        plots[1].plot(norm_running_time, velocity_dict[dim], label=dim)
-        plots[2].plot(norm_running_time, distance_dict[dim], label=dim)
+        plots[0].step(*trace(result['acceleration'][:, index]), label=dim)
+        plots[1].plot(*trace(result['velocity'][:, index]), label=dim)
+        plots[2].plot(*trace(result['distance'][:, index]), label=dim)
         
     
     plots[0].set_xticklabels("")
@@ -154,12 +784,238 @@ if __name__ == '__main__':
         
         plot.set_ylabel(ylabels[index], fontdict = font_axis)
         
-        plot.set_xbound(min(norm_running_time), max(norm_running_time))
+        plot.set_xbound(min(time), max(time))
         
         plot.grid()
     
-    plt.show()    
+    if output:
+        plt.savefig(output, dpi=300)
+        # Save the figure to the given file, used when running without a display
+        plt.close(fig)
+    else:
+        plt.show()
+
+
+def export_results(result, path, file_format='csv'):
+    # Global function for saving the acceleration, velocity and distance of a processed run without plotting
+    # csv: one column per series and axis (see result_columns), npz: one array per series as named in the result,
+    # parquet: same columns as csv, needs pyarrow (or pandas with a parquet engine) to be installed
+    if file_format == 'npz':
+        np.savez(path, **{name: np.asarray(values) for name, values in result.items()})
+        return
+    
+    table = np.column_stack((result['time'], result['acceleration'], result['velocity'], result['distance']))
+    
+    if file_format == 'csv':
+        np.savetxt(path, table, delimiter=',', fmt='%.6g', header=','.join(result_columns), comments='')
+    elif file_format == 'parquet':
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            pyarrow = None
+        
+        if pyarrow is not None:
+            pyarrow.parquet.write_table(pyarrow.table({name: table[:, index] for index, name in enumerate(result_columns)}), path)
+        else:
+            try:
+                import pandas
+            except ImportError:
+                raise SystemExit("pyarrow or pandas is required to export to parquet (pip install pyarrow)")
+            pandas.DataFrame(table, columns=result_columns).to_parquet(path)
+    else:
+        raise ValueError("Unknown export format: {}".format(file_format))
+
+
+def is_output(path):
+    # Global function for checking whether a file was written by this program for a log, from its name
+    return os.path.splitext(os.path.basename(path))[0].endswith(output_suffixes)
+
+
+def output_path(path, outdir, suffix):
+    # Global function for naming the files produced for a logged data file
+    # e.g. logs/car1.csv with suffix '.png' becomes <outdir>/car1.png
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(outdir if outdir else os.path.dirname(path), stem + suffix)
+
+
+def process_run(path, outdir=None, stream=False, chunk_size=65536, max_points=render_bins, method='euler', correction=None, cache_dir=None, export_format=None, legacy=False):
+    # Global function for processing one logged data file in a batch
+    # Saves the plot (or the streamed results) next to the file or in outdir and returns the summary statistics
+    # If export_format is given the results are exported in that format (see export_results()) instead of plotted
+    # legacy processes the file with process_file_legacy(), as --legacy does for a single file
+    if stream:
+        summary = stream_file(path, output_path(path, outdir, '-integrated.csv'), chunk_size, method)
+    else:
+        if legacy:
+            result = process_file_legacy(path)
+        elif cache_dir:
+            result = process_file_cached(path, ResultCache(cache_dir), method=method, correction=correction)
+        else:
+            result = process_file(path, chunk_size=chunk_size, method=method, correction=correction)
+        summary = summarise(result)
+        if export_format:
+            with timed('export'):
+                export_results(result, output_path(path, outdir, '-results.' + export_format), export_format)
+        else:
+            with timed('render'):
+                plot_results(result, output_path(path, outdir, '.png'), max_points)
+    
+    summary['file'] = path
+    if stage_times is not None:
+        # Durations recorded in a worker process are returned with the summary so they can be combined
+        summary['stage_times'] = dict(stage_times)
+        stage_times.clear()
+    return summary
+
+
+def init_worker(profile=False, level=log_levels['info']):
+    # Global function run when each worker process starts
+    # Worker processes have no display so a non-interactive backend is used. Pyplot is only imported if a plot is saved
+    global log_level
+    log_level = level
+    use_backend('Agg')
+    if profile:
+        enable_profiling()
+
+
+def write_summary(summaries, path):
+    # Global function for writing the summary statistics of every run to a CSV file
+    columns = ['file', 'rows'] + ['{}_{}'.format(stat, dim) for stat in ['peak_accel', 'final_velocity', 'final_distance'] for dim in axis]
+    
+    with open(path, 'w') as file:
+        file.write(','.join(columns) + '\n')
+        for summary in summaries:
+            file.write(','.join(str(summary[column]) for column in columns) + '\n')
+
+
+# ========== Main Program 
+if __name__ == '__main__':
+    # ========== Argument Parsing
+    parser = argparse.ArgumentParser(description='Convert logged Microbit acceleration data to velocity and displacement and plot the results.')
+    parser.add_argument('files', nargs='*', default=['microbit.csv'], help='Logged data files (CSV or binary) or glob patterns. Defaults to microbit.csv.')
+    parser.add_argument('--legacy', action='store_true', help='Integrate one sample at a time with calculations() instead of integrate(). Used for checking outputs against each other.')
+    parser.add_argument('--stream', action='store_true', help='Read and integrate each file a chunk at a time in bounded memory. Results are written to CSV instead of plotted.')
+    parser.add_argument('--chunk-size', type=int, default=65536, help='Number of rows read per chunk.')
+    parser.add_argument('--convert', action='store_true', help='Convert each CSV file to the binary log format (.mbin) and exit.')
+    parser.add_argument('--outdir', help='Folder the plots, streamed results and binary files are saved to. Defaults to the folder of each file.')
+    parser.add_argument('--jobs', type=int, default=None, help='Number of worker processes used when processing several files. Defaults to the number of CPUs.')
+    parser.add_argument('--summary', default='summary.csv', help='File the summary statistics of a batch are written to.')
+    parser.add_argument('--method', choices=['euler', 'trapezoid', 'simpson'], default='euler', help='Integration scheme. euler matches calculations().')
+    parser.add_argument('--correction', choices=['none', 'detrend', 'zupt'], default='none', help='Drift correction applied to velocity: linear detrend to rest at the end of the run, or zero velocity updates while stationary.')
+    parser.add_argument('--cache-dir', default='.display_cache', help='Folder the parsed, normalised and integrated results are cached in.')
+    parser.add_argument('--no-cache', action='store_true', help='Process every file from scratch without using the cache.')
+    parser.add_argument('--render', metavar='PNG', help='Save the plot of a single file to PNG without opening a window. Traces are decimated to --max-points.')
+    parser.add_argument('--no-plot', action='store_true', help='Export the acceleration, velocity and distance of each file instead of plotting, without loading matplotlib.')
+    parser.add_argument('--export-format', choices=['csv', 'npz', 'parquet'], default='csv', help='File format used by --no-plot. Files are saved as <name>-results.<format>. parquet needs pyarrow or pandas.')
+    parser.add_argument('--max-points', type=int, default=render_bins, help='Number of bins each trace is decimated to when saving plots. 0 plots every sample.')
+    parser.add_argument('--log-level', choices=list(log_levels), default='info', help='Amount printed while processing. debug prints the values of every row with --legacy.')
+    parser.add_argument('--profile', action='store_true', help='Print how long each processing stage (parse, normalise, integrate, render) took.')
+    args = parser.parse_args()
+    
+    log_level = log_levels[args.log_level]
+    if args.profile:
+        enable_profiling()
+    
+    correction = None if args.correction == 'none' else args.correction
+    cache_dir = None if args.no_cache else args.cache_dir
+    export_format = args.export_format if args.no_plot else None
+    if args.stream and (args.method == 'simpson' or correction):
+        parser.error('--stream only supports the euler and trapezoid methods without drift correction')
+    if args.stream and args.legacy:
+        parser.error('--legacy cannot be used with --stream')
+    
+    # ========== File Selection
+    # Glob patterns are expanded here so they also work on shells that do not expand them
+    # Results and summaries written next to the logs by an earlier run are left out of the matches so they are not read as logs
+    paths = []
+    for pattern in args.files:
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            paths.append(pattern)
+        elif glob.escape(pattern) == pattern:
+            paths.extend(matches) # Named file, used even if it looks like a result
+        else:
+            paths.extend(match for match in matches if not is_output(match) and os.path.abspath(match) != os.path.abspath(args.summary))
+    
+    if not paths:
+        parser.error('no log files matched {}'.format(' '.join(args.files)))
+    
+    binary_paths = [path for path in paths if os.path.isfile(path) and is_binary_log(path)]
+    if args.legacy and binary_paths:
+        parser.error('--legacy only reads CSV logs, {} is a binary log'.format(binary_paths[0]))
+    
+    if args.render and (len(paths) != 1 or args.outdir):
+        parser.error('--render saves the plot of a single file, use --outdir to save the plots of several files')
+    
+    if args.outdir:
+        os.makedirs(args.outdir, exist_ok=True)
+    
+    # ========== Binary Conversion
+    if args.convert:
+        for path in paths:
+            output = output_path(path, args.outdir, '.mbin')
+            print("Converted {} rows to {}".format(convert_to_binary(path, output, args.chunk_size), output))
+        raise SystemExit(0)
+    
+    # ========== Single File
+    if len(paths) == 1 and not args.outdir:
+        # A single file is plotted in a window as before, or streamed or exported to file
+        if args.stream:
+            rows = stream_file(paths[0], output_path(paths[0], None, '-integrated.csv'), args.chunk_size, args.method)['rows']
+            if args.profile:
+                print(profile_report(stage_times, rows))
+        else:
+            if args.legacy:
+                result = process_file_legacy(paths[0])
+            elif cache_dir:
+                result = process_file_cached(paths[0], ResultCache(cache_dir), method=args.method, correction=correction)
+            else:
+                result = process_file(paths[0], chunk_size=args.chunk_size, method=args.method, correction=correction)
+            rows = len(result['time']) - 1 # Less the leading 0 row
+            
+            if export_format:
+                output = output_path(paths[0], None, '-results.' + export_format)
+                with timed('export'):
+                    export_results(result, output, export_format)
+                print("Exported {} rows to {}".format(rows, output))
+                if args.profile:
+                    print(profile_report(stage_times, rows))
+            elif args.render:
+                # Renders straight to file with a non-interactive backend
+                use_backend('Agg')
+                with timed('render'):
+                    plot_results(result, args.render, args.max_points)
+                if args.profile:
+                    print(profile_report(stage_times, rows))
+            else:
+                if args.profile:
+                    print(profile_report(stage_times, rows)) # Printed before the window is shown as it blocks until closed
+                plot_results(result)
+        raise SystemExit(0)
+    
+    # ========== Batch Processing
+    # Each file is processed in its own worker process, plots are saved rather than shown (or results exported with --no-plot)
+    summaries = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs, initializer=init_worker, initargs=(args.profile, log_level)) as executor:
+        futures = {executor.submit(process_run, path, args.outdir, args.stream, args.chunk_size, args.max_points, args.method, correction, cache_dir, export_format, args.legacy): path for path in paths}
+        
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                summary = future.result()
+            except Exception as e:
+                print("{}: {}".format(futures[future], e))
+                continue
+            
+            for stage, durations in summary.pop('stage_times', {}).items():
+                stage_times.setdefault(stage, []).extend(durations)
+            
+            summaries.append(summary)
+            print("{}: {} rows, Final velocity: {}, Final distance: {}".format(summary['file'], summary['rows'], 
+                  [summary['final_velocity_' + dim] for dim in axis], [summary['final_distance_' + dim] for dim in axis]))
+    
+    summaries.sort(key=lambda summary: summary['file'])
+    write_summary(summaries, args.summary)
     
-    # plt.savefig('MicrobitAcceleration.png', dpi=300)
-    # Save the figure in the same folder as the code. 
-    # Commented out for testing purposes
\ No newline at end of file
+    if args.profile:
+        print(profile_report(stage_times, sum(summary['rows'] for summary in summaries)))
@@ -0,0 +1,236 @@
+# Description: A program that reads the acceleration samples printed by the relay Microbit over serial and plots acceleration, velocity and displacement live as the car drives.
+# Version: 20261018-1000
+
+# ========== Library Imports
+import argparse
+import asyncio
+import sys
+import threading
+import time
+import numpy as np
+
+from display import axis, weighting_dict, accel_norm_array, time_scale, StreamIntegrator, get_pyplot
+
+try:
+    import serial # pyserial, only needed when reading from a serial port
+except ImportError:
+    serial = None
+
+# ========== Global Variable Declaration
+time_units = {'milliseconds': 0.001, 'seconds': 1.0} # Factor converting the running time of each unit to seconds
+
+# ========== Class Declaration
+class RollingWindow:
+    # Fixed size store of the most recent rows, so memory stays bounded however long the run is
+    # Rows are written into a preallocated array that wraps around when full
+
+    def __init__(self, capacity, columns):
+        self.data = np.zeros((capacity, columns))
+        self.head = 0 # Index the next row is written to
+        self.count = 0
+
+    def extend(self, rows):
+        rows = rows[-len(self.data):]
+        capacity = len(self.data)
+        index = (self.head + np.arange(len(rows))) % capacity
+        self.data[index] = rows
+        self.head = (self.head + len(rows)) % capacity
+        self.count = min(self.count + len(rows), capacity)
+
+    def view(self):
+        # Returns the stored rows, oldest first
+        if self.count < len(self.data):
+            return self.data[:self.count]
+        return np.roll(self.data, -self.head, axis=0)
+
+
+class LivePlot:
+    # Acceleration, velocity and displacement plots updated by blitting
+    # Time is plotted relative to the newest sample so the axes stay fixed, only the lines are redrawn each frame
+    # The background is only redrawn when a line leaves its y axis limits
+    # Pyplot is imported here rather than at the top so --headless runs do not load matplotlib
+
+    def __init__(self, window):
+        self.plt = get_pyplot()
+        self.fig, self.plots = self.plt.subplots(3, 1, figsize=(6, 6), sharex=True)
+        self.fig.subplots_adjust(left=0.125, bottom=0.1, right=0.98, top=0.97, hspace=0.1)
+        font_axis = {'family':'serif', 'color':'black', 'size':10}
+        ylabels = ['Acceleration [ms^-2]','Velocity [ms^-1]','Distance [m]']
+
+        self.lines = []
+        for index, plot in enumerate(self.plots):
+            self.lines.append([plot.plot([], [], label=dim, animated=True)[0] for dim in axis])
+            plot.set_ylabel(ylabels[index], fontdict = font_axis)
+            plot.set_xlim(-window, 0)
+            plot.set_ylim(-1, 1)
+            plot.grid()
+        self.plots[2].set_xlabel('Time [s]', fontdict = font_axis)
+        self.plots[2].legend(fontsize=10, ncol=3, loc="lower left")
+
+        self.fig.canvas.mpl_connect('draw_event', self.on_draw)
+        self.background = None
+        self.plt.show(block=False)
+        self.plt.pause(0.1)
+
+    def on_draw(self, event):
+        # Caches the background whenever the full figure is drawn
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+
+    def update(self, rows):
+        # rows: time, 3 acceleration, 3 velocity and 3 displacement columns
+        if not len(rows):
+            return
+        time_arr = rows[:, 0] - rows[-1, 0]
+        rescale = False
+
+        for index, plot in enumerate(self.plots):
+            values = rows[:, 1 + (index * 3):4 + (index * 3)]
+            low, high = plot.get_ylim()
+            if values.min() < low or values.max() > high:
+                margin = (values.max() - values.min()) * 0.1 + 0.1
+                plot.set_ylim(values.min() - margin, values.max() + margin)
+                rescale = True
+            for column, line in enumerate(self.lines[index]):
+                line.set_data(time_arr, values[:, column])
+
+        if rescale or self.background is None:
+            self.fig.canvas.draw()
+        else:
+            self.fig.canvas.restore_region(self.background)
+        for index, plot in enumerate(self.plots):
+            for line in self.lines[index]:
+                plot.draw_artist(line)
+        self.fig.canvas.blit(self.fig.bbox)
+        self.fig.canvas.flush_events()
+
+    def is_open(self):
+        return self.plt.fignum_exists(self.fig.number)
+
+# ========== Function Declaration
+def serial_readline(port):
+    # Function returning a readline function for a serial port that only returns complete lines
+    # A read that times out returns whatever part of a line has arrived. The part is kept until the rest of
+    # the line arrives and None is returned meaning no data yet, as a serial port never reaches the end of its input
+    pending = []
+
+    def readline():
+        data = port.readline()
+        if not data.endswith(b'\n'):
+            pending.append(data)
+            return None
+        line = b''.join(pending) + data
+        del pending[:]
+        return line.decode(errors='ignore')
+
+    return readline
+
+
+def open_source(source, baudrate):
+    # Function returning a blocking readline function for a serial port, a file or standard input ('-')
+    # Files and standard input return '' at the end of their input, serial ports return None while waiting for data
+    if source == '-':
+        return sys.stdin.readline
+    if source.startswith('/dev/') or source.upper().startswith('COM'):
+        if serial is None:
+            raise SystemExit("pyserial is required to read from a serial port (pip install pyserial)")
+        return serial_readline(serial.Serial(source, baudrate, timeout=0.5))
+    return open(source, 'r').readline
+
+
+def read_lines(readline, queue, loop):
+    # Thread reading lines from the source so the event loop is never blocked, ends by queueing None
+    # Runs as a daemon thread so a read waiting for data does not stop the program exiting when the plot is closed
+    while True:
+        line = readline()
+        if line is None:
+            continue # Nothing received from the serial port yet
+        if not line:
+            break
+        asyncio.run_coroutine_threadsafe(queue.put(line), loop).result()
+    asyncio.run_coroutine_threadsafe(queue.put(None), loop).result()
+
+
+async def process_lines(queue, window_rows, integrator, scale=0.001, max_batch=1024):
+    # Task converting queued lines to acceleration, velocity and displacement and adding them to the rolling window
+    # Every line waiting is processed together so integration keeps up however fast samples arrive
+    # scale converts the running time to seconds. The relay sends milliseconds, a header line gives the units if one is read
+    while True:
+        lines = [await queue.get()]
+        while len(lines) < max_batch and not queue.empty():
+            lines.append(queue.get_nowait())
+
+        finished = lines[-1] is None
+        values = []
+        for line in lines:
+            if line is None or not line.strip():
+                continue
+            fields = line.strip().split(',')
+            try:
+                values.append([float(field) for field in fields[:4]])
+            except ValueError:
+                if 'time' in line.lower():
+                    scale = time_scale(line) # Header line printed by the relay gives the units of the running time
+
+        if values:
+            chunk = np.array([row for row in values if len(row) == 4])
+            if len(chunk):
+                accel = np.column_stack([accel_norm_array(chunk[:, index + 1], weighting_dict[dim]) for index, dim in enumerate(axis)])
+                time_arr, velocity, displacement = integrator.update(chunk[:, 0] * scale, accel)
+                window_rows.extend(np.column_stack((time_arr, accel, velocity, displacement)))
+
+        if finished:
+            return
+
+
+async def render(window_rows, plot, fps, done):
+    # Task redrawing the plot (or printing the latest values) at a steady frame rate until the input ends
+    period = 1 / fps
+    while not done.is_set():
+        start = time.perf_counter()
+        rows = window_rows.view()
+        if plot:
+            if not plot.is_open():
+                return
+            plot.update(rows)
+        elif len(rows):
+            print("Time: {:.3f}, Velocity: {}, Distance: {}".format(rows[-1, 0], np.round(rows[-1, 4:7], 3), np.round(rows[-1, 7:10], 3)))
+        await asyncio.sleep(max(0, period - (time.perf_counter() - start)))
+
+
+async def main(args):
+    queue = asyncio.Queue(maxsize=65536)
+    window_rows = RollingWindow(int(args.window * args.max_rate), 10)
+    integrator = StreamIntegrator(args.method)
+    plot = None if args.headless else LivePlot(args.window)
+    done = asyncio.Event()
+
+    reader = threading.Thread(target=read_lines, args=(open_source(args.source, args.baudrate), queue, asyncio.get_running_loop()), daemon=True)
+    reader.start()
+    processor = asyncio.create_task(process_lines(queue, window_rows, integrator, time_units[args.time_unit]))
+    renderer = asyncio.create_task(render(window_rows, plot, args.fps, done))
+
+    # Runs until the input ends, or the plot window is closed which stops processing as a serial port never ends
+    await asyncio.wait([processor, renderer], return_when=asyncio.FIRST_COMPLETED)
+    done.set()
+    if not processor.done():
+        processor.cancel()
+    await renderer
+
+    rows = window_rows.view()
+    if len(rows):
+        print("Final time: {:.3f}, Velocity: {}, Distance: {}".format(rows[-1, 0], np.round(rows[-1, 4:7], 3), np.round(rows[-1, 7:10], 3)))
+
+# ========== Main Program
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Live plot of the acceleration samples streamed from the acquisition Microbit through the relay Microbit.')
+    parser.add_argument('source', help="Serial port of the relay Microbit (e.g. /dev/ttyACM0 or COM3), a file, or - for standard input.")
+    parser.add_argument('--baudrate', type=int, default=115200)
+    parser.add_argument('--window', type=float, default=20, help='Seconds of data shown.')
+    parser.add_argument('--max-rate', type=int, default=100, help='Highest expected sample rate (Hz), used to size the rolling window.')
+    parser.add_argument('--fps', type=float, default=20, help='Frames drawn per second.')
+    parser.add_argument('--method', choices=['euler', 'trapezoid'], default='euler', help='Integration scheme.')
+    parser.add_argument('--time-unit', choices=list(time_units), default='milliseconds', help='Units of the running time until a header line is read. The relay sends milliseconds.')
+    parser.add_argument('--headless', action='store_true', help='Print the latest values instead of plotting.')
+    args = parser.parse_args()
+
+    asyncio.run(main(args))
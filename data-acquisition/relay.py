@@ -0,0 +1,29 @@
+# Description: A program for a second Microbit, connected to a computer by USB, that receives the acceleration samples streamed by the acquisition program and prints them over serial in the same format as the exported log.
+# Version: 20261018-1000
+
+# ========== Library Imports
+from microbit import *
+import radio
+import samples
+
+# ========== Microbit Configuration
+global_radio_group = 255 # Must match the acquisition program
+radio.config(group=global_radio_group, power=7, length=251, queue=8)
+radio.on()
+header_period = 5000 # Time between repeats of the header line (ms), so a receiver that connects late still gets the units
+
+# ========== Relay
+# Prints every sample received as a line of running time, x, y, z, with the header line repeated every header_period
+display.show(Image.HAPPY)
+last_header = running_time() - header_period
+
+while True:
+    if running_time() - last_header >= header_period:
+        print("Time (milliseconds),x,y,z")
+        last_header = running_time()
+    packet = radio.receive_bytes()
+    if packet:
+        for sample in samples.decode(packet):
+            print("{},{},{},{}".format(sample[0], sample[1], sample[2], sample[3]))
+    else:
+        sleep(1)
@@ -0,0 +1,48 @@
+# Description: Radio packet format for streaming batches of acceleration samples from the acquisition Microbit to the relay Microbit. Used on the Microbit and on desktop Python.
+# Version: 20261017-1700
+
+# ========== Library Imports
+try:
+    import struct
+except ImportError:
+    import ustruct as struct # MicroPython name for the struct module
+
+# ========== Packet Format
+packet_version = 1 # Increased whenever the layout changes so old packets are ignored rather than misread
+header_format = '<BBI'
+# Header layout (little endian): version, number of samples, running time of the first sample (ms)
+sample_format = '<Hhhh'
+# Sample layout: time since the first sample (ms), x, y, z (milliG)
+header_size = struct.calcsize(header_format)
+sample_size = struct.calcsize(sample_format)
+max_samples = 16 # Samples per packet, keeps packets within the radio's 251 byte limit
+
+# ========== Function Declaration
+def encode(time_buffer, accel_buffer, start, count):
+    # Function to pack count samples from the acquisition buffers, starting at index start, into a packet
+    # accel_buffer holds x, y, z of each sample in turn
+    packet = bytearray(header_size + (count * sample_size))
+    struct.pack_into(header_format, packet, 0, packet_version, count, time_buffer[start])
+
+    for index in range(count):
+        sample = start + index
+        struct.pack_into(sample_format, packet, header_size + (index * sample_size), time_buffer[sample] - time_buffer[start],
+                         accel_buffer[sample * 3], accel_buffer[sample * 3 + 1], accel_buffer[sample * 3 + 2])
+    return packet
+
+
+def decode(packet):
+    # Function to unpack a packet into a list of (running time, x, y, z) samples
+    # Returns an empty list if the packet is missing, the wrong size or a different version
+    if not packet or len(packet) < header_size or packet[0] != packet_version:
+        return []
+
+    version, count, first_time = struct.unpack_from(header_format, packet, 0)
+    if len(packet) != header_size + (count * sample_size):
+        return []
+
+    samples = []
+    for index in range(count):
+        offset, x, y, z = struct.unpack_from(sample_format, packet, header_size + (index * sample_size))
+        samples.append((first_time + offset, x, y, z))
+    return samples